@@ -9,17 +9,242 @@ import tkinter as tk
 from tkinter import messagebox, simpledialog
 import math
 import json
+import copy
 import os
+import argparse
+import tempfile
+import signal
+import _thread
+import queue
+import socket
+import multiprocessing
+from bisect import bisect_left
+import threading
 from threading import Thread
 import time
 
+# Параметры проекции колец моделью камеры
+CAMERA_NEAR_PLANE = 0.1  # Ближняя плоскость отсечения в метрах
+CAMERA_OFFSCREEN_MARGIN = 50  # Запас за краем экрана, где ломаная ещё детализируется (пиксели)
+TESSELLATION_INITIAL_SEGMENTS = 8  # Начальное число сегментов дуги
+TESSELLATION_MAX_DEPTH = 8  # Максимальная глубина деления каждого сегмента
+RING_CACHE_STATES = 8  # Сколько состояний камеры держать в кэше ломаных (по одному на уровень зума)
+
+# Параметры дальномера под курсором
+RANGE_FINDER_GRID_STEP = 0.25  # Шаг сетки дистанций в таблице обратной проекции (метры)
+RANGE_FINDER_OFFSET = 18  # Смещение подписи от указателя мыши (пиксели)
+POINTER_POLL_MS = 30  # Период опроса указателя там, где оверлей пропускает мышь (Windows)
+
+# Параметры сторожа цикла событий
+WATCHDOG_HEARTBEAT_MS = 100  # Период пульса из mainloop (миллисекунды)
+WATCHDOG_POLL_INTERVAL = 0.25  # Период проверки пульса в потоке сторожа (секунды)
+WATCHDOG_STALL_MS = 250  # Задержка пульса, после которой пишется сообщение о подвисании
+WATCHDOG_LOG_INTERVAL = 60  # Период вывода гистограммы задержек (секунды)
+WATCHDOG_EXIT_GRACE = 5  # Сколько ждать quit_app перед аварийным выходом (секунды)
+WATCHDOG_SUSPEND_GAP = 2.0  # Пауза между проверками, означающая остановку процесса (сон, секунды)
+WATCHDOG_TRIP_POLLS = 3  # Сколько проверок подряд пульс должен отсутствовать дольше timeout
+WATCHDOG_BUCKETS_MS = (5, 10, 20, 50, 100, 250, 500, 1000, 5000)  # Границы гистограммы
+
+# Маркеры на земле
+MARKER_RING_RADII = (2, 5)  # Радиусы колец вокруг маркера (метры)
+MARKER_RING_SEGMENTS = 24  # Сегментов в ломаной кольца маркера
+MARKER_HIT_RADIUS = 12  # Радиус попадания щелчком по маркеру (пиксели)
+MARKER_GRID_CELL = 64  # Размер ячейки сетки пространственного индекса (пиксели)
+MARKER_COLOR = '#00FFFF'
+MARKER_HIT_COLOR = '#010101'  # Почти черный, но не прозрачный цвет оверлея Windows - ловит щелчки
+
+# Управление уровнями зума по сети (UDP на localhost)
+IPC_POLL_MS = 10  # Период разбора принятых команд в mainloop (миллисекунды)
+
+# Редактор дистанций в окне управления
+DISTANCE_EDITOR_ROWS = 8  # Строк редактора (видимая часть списка дистанций)
+DISTANCE_RANGE_LIMIT = 500  # Максимум колец, добавляемых одним диапазоном
+
+# Подгонка калибровки по нескольким точкам
+CALIBRATION_MIN_POSITIONED = 3  # Точек с позицией на экране, нужных для подгонки перспективы
+CALIBRATION_HUBER_DELTA = 0.05  # Порог робастной функции потерь (относительная ошибка 5%)
+CALIBRATION_MAX_ITERATIONS = 40  # Итераций Левенберга-Марквардта на один старт
+CALIBRATION_MAX_SAMPLES = 100  # Сколько последних точек хранить для каждого уровня зума
+
+# Границы параметров моделей (совпадают с диапазонами ползунков)
+CALIBRATION_BOUNDS = {
+    'scale': [(1.0, 10000.0)],
+    'ellipse': [(1.0, 10000.0), (0.0, 0.8), (0.1, 1.0)],
+    'camera': [(30.0, 120.0), (0.3, 3.0), (-30.0, 60.0)],
+}
+
+def calibration_residuals(model, params, samples):
+    """Относительные ошибки модели по точкам калибровки
+    
+    scale   - (пикс/метр): радиус кольца d * ppm против измеренного радиуса
+    ellipse - (пикс/метр, горизонт, сжатие): то же плюс попадание отмеченной
+              точки на эллипс дистанции
+    camera  - (FOV, высота глаз, наклон): дистанция по земле до отмеченной точки
+    """
+    residuals = []
+    for sample in samples:
+        distance = sample['distance']
+        positioned = sample.get('x') is not None
+        
+        if model in ('scale', 'ellipse'):
+            pixels_per_meter = params[0]
+            residuals.append(distance * pixels_per_meter / sample['radius'] - 1.0)
+        
+        if model == 'ellipse' and positioned:
+            pixels_per_meter, horizon_offset, ratio = params
+            foot_y = sample['foot_position_y']
+            horizon_y = foot_y - sample['screen_height'] * horizon_offset
+            center_y = foot_y - min(distance / 50.0, 1.0) * (foot_y - horizon_y)
+            radius_x = distance * pixels_per_meter
+            radius_y = radius_x * ratio
+            value = ((sample['x'] - sample['center_x']) / radius_x) ** 2 + ((sample['y'] - center_y) / radius_y) ** 2
+            residuals.append(math.sqrt(value) - 1.0)
+        
+        if model == 'camera' and positioned:
+            fov, height, pitch = params
+            pitch = math.radians(pitch)
+            focal = (sample['screen_height'] / 2) / math.tan(math.radians(fov) / 2)
+            v = (sample['crosshair_y'] - sample['y']) / focal
+            denominator = math.sin(pitch) - v * math.cos(pitch)
+            if denominator <= 0:
+                residuals.append(1.0)  # Точка оказалась выше горизонта
+                continue
+            scale = height / denominator
+            forward = scale * (math.cos(pitch) + v * math.sin(pitch))
+            side = (sample['x'] - sample['center_x']) * scale / focal
+            residuals.append(math.hypot(forward, side) / distance - 1.0)
+    
+    return residuals
+
+def huber_weights(residuals):
+    """Веса IRLS для функции потерь Хьюбера"""
+    return [1.0 if abs(r) <= CALIBRATION_HUBER_DELTA else CALIBRATION_HUBER_DELTA / abs(r) for r in residuals]
+
+def huber_cost(residuals):
+    """Суммарная робастная ошибка"""
+    cost = 0.0
+    for r in residuals:
+        a = abs(r)
+        if a <= CALIBRATION_HUBER_DELTA:
+            cost += 0.5 * r * r
+        else:
+            cost += CALIBRATION_HUBER_DELTA * (a - 0.5 * CALIBRATION_HUBER_DELTA)
+    return cost
+
+def solve_linear(matrix, vector):
+    """Решение малой линейной системы методом Гаусса с выбором ведущего элемента"""
+    n = len(vector)
+    a = [row[:] + [vector[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-15:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(col + 1, n):
+            factor = a[r][col] / a[col][col]
+            for c in range(col, n + 1):
+                a[r][c] -= factor * a[col][c]
+    solution = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        solution[r] = (a[r][n] - sum(a[r][c] * solution[c] for c in range(r + 1, n))) / a[r][r]
+    return solution
+
+def fit_calibration_from_start(task):
+    """Робастный Левенберг-Марквардт из одной начальной точки
+    
+    task = (модель, начальные параметры, точки). Возвращает (ошибка, параметры).
+    Функция модульного уровня, чтобы ее можно было отдать в пул процессов.
+    """
+    model, params, samples = task
+    bounds = CALIBRATION_BOUNDS[model]
+    clamp = lambda p: [min(max(value, low), high) for value, (low, high) in zip(p, bounds)]
+    
+    params = clamp(list(params))
+    residuals = calibration_residuals(model, params, samples)
+    cost = huber_cost(residuals)
+    damping = 1e-3
+    
+    for _ in range(CALIBRATION_MAX_ITERATIONS):
+        # Якобиан конечными разностями
+        jacobian = []
+        for j in range(len(params)):
+            step = 1e-6 * max(1.0, abs(params[j]))
+            shifted = params[:]
+            shifted[j] += step
+            shifted_residuals = calibration_residuals(model, shifted, samples)
+            jacobian.append([(b - a) / step for a, b in zip(residuals, shifted_residuals)])
+        
+        # Нормальные уравнения с весами Хьюбера
+        weights = huber_weights(residuals)
+        n = len(params)
+        normal = [[sum(w * jacobian[i][k] * jacobian[j][k] for k, w in enumerate(weights)) for j in range(n)] for i in range(n)]
+        gradient = [sum(w * jacobian[i][k] * residuals[k] for k, w in enumerate(weights)) for i in range(n)]
+        
+        improved = False
+        while damping < 1e10:
+            damped = [row[:] for row in normal]
+            for i in range(n):
+                damped[i][i] += damping * max(normal[i][i], 1e-12)
+            delta = solve_linear(damped, [-g for g in gradient])
+            if delta is None:
+                damping *= 10
+                continue
+            
+            candidate = clamp([p + d for p, d in zip(params, delta)])
+            candidate_residuals = calibration_residuals(model, candidate, samples)
+            candidate_cost = huber_cost(candidate_residuals)
+            if candidate_cost < cost:
+                converged = cost - candidate_cost < 1e-12 * max(1.0, cost)
+                params, residuals, cost = candidate, candidate_residuals, candidate_cost
+                damping = max(damping / 3, 1e-9)
+                improved = not converged
+                break
+            damping *= 4
+        
+        if not improved:
+            break
+    
+    return cost, params
+
+def calibration_starts(model, samples, current):
+    """Сетка начальных точек для невыпуклых параметров перспективы"""
+    ratios = sorted(sample['radius'] / sample['distance'] for sample in samples)
+    pixels_per_meter = ratios[len(ratios) // 2] if ratios else current[0]
+    
+    if model == 'scale':
+        return [[pixels_per_meter]]
+    if model == 'ellipse':
+        starts = [[pixels_per_meter, horizon, ratio]
+                  for horizon in (0.05, 0.2, 0.35, 0.5, 0.65, 0.8)
+                  for ratio in (0.1, 0.25, 0.4, 0.55, 0.7, 0.85, 1.0)]
+    else:
+        starts = [[fov, height, pitch]
+                  for fov in (40, 55, 70, 85, 100, 115)
+                  for pitch in (-10, 0, 10, 20, 35)
+                  for height in (1.0, 1.8)]
+    return [current] + starts
+
+def fit_calibration(model, samples, current, pool=None):
+    """Подогнать параметры модели по точкам калибровки
+    
+    Старты считаются параллельно в пуле процессов (если он есть), лучший по
+    робастной ошибке побеждает. Возвращает (ошибка, параметры).
+    """
+    tasks = [(model, start, samples) for start in calibration_starts(model, samples, current)]
+    if pool is not None and len(tasks) > 1:
+        results = pool.map(fit_calibration_from_start, tasks, chunksize=max(1, len(tasks) // (4 * (os.cpu_count() or 1))))
+    else:
+        results = [fit_calibration_from_start(task) for task in tasks]
+    return min(results, key=lambda result: result[0])
+
 class DistanceOverlay:
-    def __init__(self):
+    def __init__(self, settings_file='distance_settings.json', recorder=None):
         self.root = tk.Tk()
         
         # Настройки по умолчанию (ДОЛЖНЫ БЫТЬ ДО setup_window!)
         self.calibration_pixels_per_meter = 100  # пикселей на метр (будет калиброваться)
         self.distances = [1, 5, 10, 25, 40]  # метры
+        self.distance_first_row = 0  # Номер дистанции в первой строке редактора
         self.overlay_enabled = False
         self.calibration_mode = False
         
@@ -29,6 +254,48 @@ class DistanceOverlay:
         self.perspective_ratio = 0.2  # Сжатие эллипсов (0.1 = сильно сжато, 1.0 = круг)
         self.foot_position_ratio = 0.85  # Позиция ног в процентах от высоты экрана
         
+        # Физическая модель камеры (pinhole-проекция вместо эвристики перспективы)
+        self.camera_model_enabled = False  # Проецировать кольца через модель камеры
+        self.camera_fov = 70.0  # Вертикальный угол обзора в градусах
+        self.camera_height = 1.7  # Высота глаз над землей в метрах
+        self.camera_pitch = 0.0  # Наклон камеры вниз в градусах (0 = горизонт в центре экрана)
+        self.tessellation_tolerance = 0.5  # Допустимое отклонение ломаной от дуги в пикселях
+        
+        # Кэш спроецированных колец: состояние камеры -> {дистанция: ломаная}
+        self.ring_polyline_cache = {}
+        
+        # Уровни зума (прицеливание, оптика) - у каждого своя калибровка
+        self.zoom_layers = [
+            {'name': 'Без прицела', 'calibration_pixels_per_meter': 100, 'camera_fov': 70.0}
+        ]
+        self.active_zoom_layer = 0
+        self.ipc_queue = queue.Queue()  # Команды, принятые потоком IPC
+        
+        # Подгонка калибровки по нескольким точкам
+        self.calibration_pool = None  # Пул процессов для стартов подгонки (создается при калибровке)
+        self.calibration_point = None  # Отмеченная на экране позиция эталонного объекта
+        
+        # Маркеры на земле: id -> {'id', 'name', 'distance', 'angle'} (полярные координаты от ног)
+        self.markers = {}
+        self.next_marker_id = 1
+        self.markers_enabled = False  # Редактирование маркеров щелчками по оверлею
+        self.marker_grids = {}  # Уровень зума -> MarkerGrid с экранными позициями маркеров
+        self.dragged_marker = None  # Маркер, который сейчас перетаскивается
+        self.drag_position = None  # Последняя позиция указателя при перетаскивании
+        self.marker_drag_job = None  # Отложенное применение перетаскивания (after_idle)
+        
+        # Дальномер под курсором
+        self.range_finder_enabled = False  # Показывать дистанцию до точки под курсором
+        self.pointer_position = None  # Последняя позиция указателя на оверлее
+        self.range_finder_job = None  # Отложенное обновление подписи (after_idle)
+        self.pointer_poll_job = None  # Опрос позиции указателя (after) вместо <Motion>
+        self.range_finder_anchor = None  # Позиция, в которой сейчас нарисована подпись
+        self.range_finder_text = None  # Текст, который сейчас показан
+        
+        # Таблица обратной проекции по строкам экрана (заполняется лениво)
+        self.inverse_table = {}
+        self.inverse_table_key = None
+        
         # Настройки мониторов
         self.current_monitor = 0  # Текущий монитор (по умолчанию основной)
         self.monitor_geometries = []  # Список геометрий мониторов
@@ -37,9 +304,17 @@ class DistanceOverlay:
         self.circle_colors = ['#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#FF00FF']
         
         # Настройки
-        self.settings_file = 'distance_settings.json'
+        self.settings_file = settings_file
         self.load_settings()
         
+        # Сторож цикла событий (запускается из main)
+        self.watchdog = None
+        
+        # Запись событий (до создания виджетов, чтобы их команды шли через запись)
+        self.recorder = recorder
+        if self.recorder:
+            self.recorder.install(self)
+        
         # Определяем мониторы
         self.detect_monitors()
         
@@ -136,11 +411,38 @@ class DistanceOverlay:
         # Создаем отдельное окно для управления
         self.control_window = tk.Toplevel(self.root)
         self.control_window.title("Distance Attack - Управление")
-        self.control_window.geometry("450x800")
+        self.control_window.geometry(f"450x{min(1000, self.control_window.winfo_screenheight() - 80)}")
         self.control_window.attributes('-topmost', True)
         
+        # Статус и кнопка выхода закреплены внизу, остальное прокручивается
+        bottom_frame = tk.Frame(self.control_window)
+        bottom_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        self.control_canvas = tk.Canvas(self.control_window, highlightthickness=0)
+        control_scrollbar = tk.Scrollbar(self.control_window, orient=tk.VERTICAL, command=self.control_canvas.yview)
+        control_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.control_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.control_canvas.configure(yscrollcommand=control_scrollbar.set)
+        
+        self.control_frame = tk.Frame(self.control_canvas)
+        control_item = self.control_canvas.create_window(0, 0, window=self.control_frame, anchor='nw')
+        self.control_frame.bind(
+            '<Configure>',
+            lambda e: self.control_canvas.configure(scrollregion=self.control_canvas.bbox('all'))
+        )
+        # Рамка по ширине окна, чтобы виджеты оставались по центру
+        self.control_canvas.bind(
+            '<Configure>',
+            lambda e: self.control_canvas.itemconfigure(control_item, width=e.width)
+        )
+        
+        # Колесико над любым виджетом окна (кроме редактора дистанций) листает панель
+        self.control_window.bind('<MouseWheel>', self.on_control_wheel)
+        self.control_window.bind('<Button-4>', self.on_control_wheel)
+        self.control_window.bind('<Button-5>', self.on_control_wheel)
+        
         # Выбор монитора
-        monitor_frame = tk.Frame(self.control_window)
+        monitor_frame = tk.Frame(self.control_frame)
         monitor_frame.pack(pady=10)
         
         tk.Label(monitor_frame, text="Выбор монитора:", font=('Arial', 10, 'bold')).pack()
@@ -157,50 +459,128 @@ class DistanceOverlay:
         
         # Кнопки управления
         tk.Button(
-            self.control_window, 
+            self.control_frame, 
             text="Калибровка", 
             command=self.start_calibration,
             font=('Arial', 12)
         ).pack(pady=10)
         
         tk.Button(
-            self.control_window, 
+            self.control_frame, 
             text="Включить/Выключить оверлей", 
             command=self.toggle_overlay,
             font=('Arial', 12)
         ).pack(pady=5)
         
+        self.range_finder_var = tk.BooleanVar(value=self.range_finder_enabled)
+        tk.Checkbutton(
+            self.control_frame,
+            text="Дальномер под курсором",
+            variable=self.range_finder_var,
+            command=self.toggle_range_finder,
+            font=('Arial', 10)
+        ).pack(pady=5)
+        
+        markers_frame = tk.Frame(self.control_frame)
+        markers_frame.pack(pady=5)
+        
+        self.markers_var = tk.BooleanVar(value=self.markers_enabled)
+        tk.Checkbutton(
+            markers_frame,
+            text="Маркеры (ЛКМ - поставить/тащить, ПКМ - удалить)",
+            variable=self.markers_var,
+            command=self.toggle_markers,
+            font=('Arial', 10)
+        ).pack(side=tk.LEFT)
+        tk.Button(markers_frame, text="Очистить", command=self.clear_markers, font=('Arial', 9)).pack(side=tk.LEFT)
+        
+        # Уровни зума (прицеливание, оптика)
+        zoom_frame = tk.Frame(self.control_frame)
+        zoom_frame.pack(pady=5)
+        
+        tk.Label(zoom_frame, text="Уровень зума:", font=('Arial', 10, 'bold')).pack(side=tk.LEFT)
+        
+        self.zoom_var = tk.StringVar()
+        self.zoom_combo = tk.OptionMenu(zoom_frame, self.zoom_var, '')
+        self.zoom_combo.pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(zoom_frame, text="+", command=self.add_zoom_layer, font=('Arial', 9)).pack(side=tk.LEFT)
+        tk.Button(zoom_frame, text="−", command=self.remove_zoom_layer, font=('Arial', 9)).pack(side=tk.LEFT)
+        
         # Настройки дистанций
-        tk.Label(self.control_window, text="Дистанции (метры):", font=('Arial', 10)).pack(pady=(20,5))
+        tk.Label(self.control_frame, text="Дистанции (метры):", font=('Arial', 10)).pack(pady=(20,5))
+        
+        # Редактор виртуальный: строк столько, сколько видно, при прокрутке
+        # они только перезаполняются значениями других дистанций
+        editor_frame = tk.Frame(self.control_frame)
+        editor_frame.pack(pady=5)
         
-        self.distance_frame = tk.Frame(self.control_window)
-        self.distance_frame.pack(pady=5)
+        self.distance_rows_frame = tk.Frame(editor_frame)
+        self.distance_rows_frame.pack(side=tk.LEFT)
         
-        self.distance_entries = []
-        for i, dist in enumerate(self.distances):
-            frame = tk.Frame(self.distance_frame)
-            frame.pack(side=tk.LEFT, padx=5)
+        self.distance_scrollbar = tk.Scrollbar(editor_frame, orient=tk.VERTICAL, command=self.scroll_distance_editor)
+        self.distance_scrollbar.pack(side=tk.LEFT, fill=tk.Y)
+        
+        self.distance_rows = []
+        for row in range(DISTANCE_EDITOR_ROWS):
+            frame = tk.Frame(self.distance_rows_frame)
+            frame.pack(pady=1)
+            
+            label = tk.Label(frame, width=5, anchor='e', font=('Arial', 9, 'bold'))
+            label.pack(side=tk.LEFT)
+            entry = tk.Entry(frame, width=8, justify='center')
+            entry.pack(side=tk.LEFT, padx=5)
+            entry.bind('<Return>', lambda e, row=row: self.commit_distance_row(row))
+            entry.bind('<FocusOut>', lambda e, row=row: self.commit_distance_row(row))
+            button = tk.Button(
+                frame,
+                text="✕",
+                command=lambda row=row: self.on_remove_distance_row(row),
+                font=('Arial', 8)
+            )
+            button.pack(side=tk.LEFT)
             
-            tk.Label(frame, text=f"#{i+1}:", font=('Arial', 9)).pack()
-            entry = tk.Entry(frame, width=6, justify='center')
-            entry.insert(0, str(dist))
-            entry.pack()
-            self.distance_entries.append(entry)
+            for widget in (frame, label, entry, button):
+                widget.bind('<MouseWheel>', self.on_distance_editor_wheel)
+                widget.bind('<Button-4>', self.on_distance_editor_wheel)
+                widget.bind('<Button-5>', self.on_distance_editor_wheel)
+            self.distance_rows.append((label, entry, button))
         
         tk.Button(
-            self.control_window, 
-            text="Применить дистанции", 
-            command=self.update_distances,
-            font=('Arial', 10)
-        ).pack(pady=10)
+            self.control_frame,
+            text="Добавить дистанцию",
+            command=self.on_add_distance,
+            font=('Arial', 9)
+        ).pack(pady=2)
+        
+        # Генератор диапазона: "каждые 5 м от 10 до 300"
+        range_frame = tk.Frame(self.control_frame)
+        range_frame.pack(pady=5)
+        
+        self.range_entries = []
+        for text, default in (("от", "10"), ("до", "300"), ("шаг", "5")):
+            tk.Label(range_frame, text=text, font=('Arial', 9)).pack(side=tk.LEFT)
+            entry = tk.Entry(range_frame, width=5, justify='center')
+            entry.insert(0, default)
+            entry.pack(side=tk.LEFT, padx=(2, 5))
+            self.range_entries.append(entry)
+        
+        tk.Button(
+            range_frame,
+            text="Добавить диапазон",
+            command=self.on_add_distance_range,
+            font=('Arial', 9)
+        ).pack(side=tk.LEFT)
+        
+        self.refresh_distance_rows()
         
         # Настройки перспективы
-        tk.Label(self.control_window, text="Настройки перспективы:", font=('Arial', 10, 'bold')).pack(pady=(20,5))
+        tk.Label(self.control_frame, text="Настройки перспективы:", font=('Arial', 10, 'bold')).pack(pady=(20,5))
         
         # Включение/выключение перспективы
         self.perspective_var = tk.BooleanVar(value=self.perspective_enabled)
         tk.Checkbutton(
-            self.control_window,
+            self.control_frame,
             text="Включить перспективу (эллипсы вместо кругов)",
             variable=self.perspective_var,
             command=self.toggle_perspective,
@@ -208,7 +588,7 @@ class DistanceOverlay:
         ).pack(pady=5)
         
         # Настройка горизонта
-        perspective_frame = tk.Frame(self.control_window)
+        perspective_frame = tk.Frame(self.control_frame)
         perspective_frame.pack(pady=10)
         
         tk.Label(perspective_frame, text="Высота горизонта:", font=('Arial', 9)).pack()
@@ -216,7 +596,7 @@ class DistanceOverlay:
             perspective_frame,
             from_=0.0,
             to=0.8,
-            resolution=0.1,
+            resolution=0.01,
             orient=tk.HORIZONTAL,
             length=200,
             command=self.update_perspective
@@ -230,7 +610,7 @@ class DistanceOverlay:
             perspective_frame,
             from_=0.1,
             to=1.0,
-            resolution=0.1,
+            resolution=0.01,
             orient=tk.HORIZONTAL,
             length=200,
             command=self.update_perspective
@@ -252,17 +632,76 @@ class DistanceOverlay:
         self.foot_scale.set(self.foot_position_ratio)
         self.foot_scale.pack()
         
+        # Физическая модель камеры
+        self.camera_model_var = tk.BooleanVar(value=self.camera_model_enabled)
+        tk.Checkbutton(
+            self.control_frame,
+            text="Физическая модель камеры (FOV, высота глаз, наклон)",
+            variable=self.camera_model_var,
+            command=self.toggle_camera_model,
+            font=('Arial', 9)
+        ).pack(pady=5)
+        
+        camera_frame = tk.Frame(self.control_frame)
+        camera_frame.pack(pady=5)
+        
+        tk.Label(camera_frame, text="Вертикальный FOV (градусы):", font=('Arial', 9)).pack()
+        self.fov_scale = tk.Scale(
+            camera_frame,
+            from_=30,
+            to=120,
+            resolution=1,
+            orient=tk.HORIZONTAL,
+            length=200,
+            command=self.update_camera_model
+        )
+        self.fov_scale.set(self.camera_fov)
+        self.fov_scale.pack()
+        
+        tk.Label(camera_frame, text="Высота глаз (метры):", font=('Arial', 9)).pack()
+        self.camera_height_scale = tk.Scale(
+            camera_frame,
+            from_=0.3,
+            to=3.0,
+            resolution=0.01,
+            orient=tk.HORIZONTAL,
+            length=200,
+            command=self.update_camera_model
+        )
+        self.camera_height_scale.set(self.camera_height)
+        self.camera_height_scale.pack()
+        
+        tk.Label(camera_frame, text="Наклон камеры вниз (градусы):", font=('Arial', 9)).pack()
+        self.pitch_scale = tk.Scale(
+            camera_frame,
+            from_=-30,
+            to=60,
+            resolution=0.1,
+            orient=tk.HORIZONTAL,
+            length=200,
+            command=self.update_camera_model
+        )
+        self.pitch_scale.set(self.camera_pitch)
+        self.pitch_scale.pack()
+        
         # Информация о калибровке
         self.calibration_info = tk.Label(
-            self.control_window, 
+            self.control_frame, 
             text=f"Калибровка: {self.calibration_pixels_per_meter:.1f} пикс/метр",
             font=('Arial', 10)
         )
         self.calibration_info.pack(pady=10)
         
+        tk.Button(
+            self.control_frame,
+            text="Сбросить точки калибровки",
+            command=self.clear_calibration_samples,
+            font=('Arial', 9)
+        ).pack()
+        
         # Статус
         self.status_label = tk.Label(
-            self.control_window, 
+            bottom_frame, 
             text="Статус: Выключен",
             font=('Arial', 10),
             fg='red'
@@ -271,30 +710,37 @@ class DistanceOverlay:
         
         # Горячие клавиши
         import platform
-        hotkeys_text = "Горячие клавиши:\nF1 - Калибровка\nF2 - Вкл/Выкл оверлей\nESC - Выход"
+        hotkeys_text = "Горячие клавиши:\nF1 - Калибровка\nF2 - Вкл/Выкл оверлей\nF3 - Дальномер под курсором\nF4 - Следующий уровень зума\nF5 - Редактирование маркеров\nF6 - Маркер под указателем\nESC - Выход"
         if platform.system() == 'Linux':
             hotkeys_text += "\nCtrl+C, Ctrl+Q, Alt+F4 - Выход\nКрасная кнопка на оверлее - Выход"
         
         tk.Label(
-            self.control_window, 
+            self.control_frame, 
             text=hotkeys_text,
             font=('Arial', 9),
             justify='left'
         ).pack(pady=20)
         
         tk.Button(
-            self.control_window, 
+            bottom_frame, 
             text="Выход", 
             command=self.quit_app,
             font=('Arial', 12),
             bg='red',
             fg='white'
-        ).pack(pady=20)
+        ).pack(pady=10)
+        
+        # Список уровней зума (после создания виджетов, которые он обновляет)
+        self.refresh_zoom_menu()
     
     def setup_keybinds(self):
         """Настройка горячих клавиш"""
         self.root.bind('<F1>', lambda e: self.start_calibration())
         self.root.bind('<F2>', lambda e: self.toggle_overlay())
+        self.root.bind('<F3>', lambda e: self.toggle_range_finder(not self.range_finder_enabled))
+        self.root.bind('<F4>', lambda e: self.switch_zoom_layer((self.active_zoom_layer + 1) % len(self.zoom_layers)))
+        self.root.bind('<F5>', lambda e: self.toggle_markers(not self.markers_enabled))
+        self.root.bind('<F6>', lambda e: self.drop_marker_at_pointer())
         self.root.bind('<Escape>', lambda e: self.quit_app())
         
         # Дополнительные клавиши для экстренного выхода
@@ -302,6 +748,12 @@ class DistanceOverlay:
         self.root.bind('<Control-q>', lambda e: self.quit_app())
         self.root.bind('<Alt-F4>', lambda e: self.quit_app())
         
+        # События мыши для дальномера и маркеров
+        if self.range_finder_enabled:
+            self.bind_range_finder()
+        if self.markers_enabled:
+            self.bind_markers()
+        
         # Фокус на главном окне для получения событий клавиатуры
         self.root.focus_set()
     
@@ -401,21 +853,37 @@ class DistanceOverlay:
         try:
             self.calibration_distance = float(distance_str)
         except ValueError:
+            self.calibration_distance = None
+        
+        # Точка попадает в накопленные и сохраняется на диск - ноль, отрицательные
+        # значения и nan/inf сломали бы все последующие подгонки
+        if self.calibration_distance is None or not math.isfinite(self.calibration_distance) or self.calibration_distance <= 0:
             messagebox.showerror("Ошибка", "Введите корректное число!")
             self.calibration_mode = False
             return
         
+        # Пул для подгонки перспективы запускается заранее, пока пользователь
+        # подбирает круг, - но только если с новой точкой она станет возможна
+        positioned = [sample for sample in self.get_calibration_samples() if sample['x'] is not None]
+        if ((self.camera_model_enabled or self.perspective_enabled) and
+                len(positioned) + 1 >= CALIBRATION_MIN_POSITIONED):
+            self.get_calibration_pool()
+        
         # Инструкции для калибровки
         messagebox.showinfo(
             "Калибровка", 
             f"Сейчас появится красный круг.\n"
             f"Измените его размер колесиком мыши так,\n"
             f"чтобы он соответствовал {self.calibration_distance} метрам в игре.\n"
+            f"Наведите указатель на эталонный объект и нажмите Пробел\n"
+            f"(или щелкните по нему), чтобы отметить его положение -\n"
+            f"по таким точкам подгоняется перспектива.\n"
             f"Нажмите Enter когда закончите, Esc для отмены."
         )
         
         # Показываем калибровочный круг
         self.calibration_radius = 100
+        self.calibration_point = None
         self.draw_calibration_circle()
         
         # Привязываем события для калибровки
@@ -424,6 +892,8 @@ class DistanceOverlay:
         self.root.bind('<Button-5>', self.on_mouse_wheel)  # Linux
         self.root.bind('<Return>', self.finish_calibration)
         self.root.bind('<Escape>', self.cancel_calibration)
+        self.root.bind('<space>', lambda e: self.mark_calibration_point_at_pointer())
+        self.canvas.bind('<Button-1>', self.on_calibration_click)
     
     def draw_calibration_circle(self):
         """Рисование калибровочного круга с центром в позиции ног"""
@@ -462,8 +932,14 @@ class DistanceOverlay:
             tags='calibration'
         )
         
+        # Отмеченная позиция эталонного объекта
+        if self.calibration_point:
+            point_x, point_y = self.calibration_point
+            self.canvas.create_line(point_x - 8, point_y, point_x + 8, point_y, fill='red', width=2, tags='calibration')
+            self.canvas.create_line(point_x, point_y - 8, point_x, point_y + 8, fill='red', width=2, tags='calibration')
+        
         # Текст с информацией (с контуром для лучшей видимости)
-        text_content = f"Калибровка: {self.calibration_distance}м\nКолесико для изменения размера\nЦентр круга = позиция ваших ног"
+        text_content = f"Калибровка: {self.calibration_distance}м\nКолесико для изменения размера\nЩелчок - отметить эталонный объект\nЦентр круга = позиция ваших ног"
         # Контур текста
         for dx, dy in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
             self.canvas.create_text(
@@ -497,30 +973,68 @@ class DistanceOverlay:
         
         self.draw_calibration_circle()
     
+    def on_calibration_click(self, event):
+        """Отметить положение эталонного объекта на экране"""
+        if not self.calibration_mode:
+            return
+        
+        self.calibration_point = (event.x, event.y)
+        self.draw_calibration_circle()
+    
+    def mark_calibration_point_at_pointer(self):
+        """Отметить эталонный объект под указателем (Пробел)
+        
+        На Windows щелчок по пустому месту оверлея проходит в игру, поэтому
+        положение берется из позиции указателя, как у маркеров по F6.
+        """
+        position = self.get_pointer_position()
+        if position is None:
+            return
+        
+        # Через обработчик щелчка: так отметка попадает и в запись событий
+        event = tk.Event()
+        event.x, event.y = position
+        self.on_calibration_click(event)
+    
     def finish_calibration(self, event=None):
         """Завершить калибровку"""
         if not self.calibration_mode:
             return
             
-        # Вычисляем пиксели на метр
-        self.calibration_pixels_per_meter = self.calibration_radius / self.calibration_distance
+        # Новая точка; к накопленным она добавится после успешной подгонки
+        point_x, point_y = self.calibration_point or (None, None)
+        sample = {
+            'distance': self.calibration_distance,
+            'radius': self.calibration_radius,
+            'x': point_x,
+            'y': point_y,
+            'center_x': self.center_x,
+            'crosshair_y': self.crosshair_y,
+            'foot_position_y': self.foot_position_y,
+            'screen_height': self.screen_height
+        }
         
         # Очищаем привязки событий калибровки
         self.root.unbind('<MouseWheel>')
         self.root.unbind('<Button-4>')
         self.root.unbind('<Button-5>')
         self.root.unbind('<Return>')
+        self.root.unbind('<space>')
+        self.canvas.unbind('<Button-1>')
         
         # Восстанавливаем основные привязки
         self.root.bind('<Escape>', lambda e: self.quit_app())
+        if self.markers_enabled:
+            self.bind_markers()
         
         self.calibration_mode = False
         self.clear_canvas()
         
+        # Вычисляем пиксели на метр (и перспективу, если точек достаточно)
+        self.fit_calibration_samples(sample)
+        
         # Обновляем информацию о калибровке
-        self.calibration_info.config(
-            text=f"Калибровка: {self.calibration_pixels_per_meter:.1f} пикс/метр"
-        )
+        self.update_calibration_info()
         
         # Сохраняем настройки
         self.save_settings()
@@ -537,13 +1051,111 @@ class DistanceOverlay:
         self.root.unbind('<Button-4>')
         self.root.unbind('<Button-5>')
         self.root.unbind('<Return>')
+        self.root.unbind('<space>')
+        self.canvas.unbind('<Button-1>')
         
         # Восстанавливаем основные привязки
         self.root.bind('<Escape>', lambda e: self.quit_app())
+        if self.markers_enabled:
+            self.bind_markers()
         
         self.calibration_mode = False
         self.clear_canvas()
     
+    def get_calibration_samples(self):
+        """Точки калибровки текущего уровня зума, снятые на этом экране"""
+        layer = self.zoom_layers[self.active_zoom_layer]
+        # Точки, снятые в другом разрешении, к текущему экрану не подходят
+        return [
+            sample for sample in layer.get('calibration_samples', [])
+            if sample['screen_height'] == self.screen_height and sample['center_x'] == self.center_x
+        ]
+    
+    def get_calibration_pool(self):
+        """Пул процессов для подгонки калибровки (None, если недоступен)"""
+        if self.calibration_pool is None:
+            try:
+                # spawn: без fork процесса с открытым Tk и потоками
+                self.calibration_pool = multiprocessing.get_context('spawn').Pool()
+            except (OSError, ValueError) as e:
+                print(f"Пул процессов недоступен, подгонка будет последовательной: {e}")
+        return self.calibration_pool
+    
+    def fit_calibration_samples(self, new_sample=None):
+        """Подогнать калибровку по всем точкам текущего уровня зума
+        
+        Масштаб (пикс/метр) подгоняется по радиусам всегда. Если у точек
+        отмечены позиции объектов, дополнительно подгоняются параметры текущей
+        модели перспективы: горизонт и сжатие эллипсов или FOV, высота глаз и
+        наклон камеры. Невыпуклая часть решается мультистартом в пуле процессов.
+        
+        new_sample добавляется к точкам уровня только после успешной подгонки,
+        чтобы сбойная точка не осталась в настройках.
+        """
+        layer = self.zoom_layers[self.active_zoom_layer]
+        samples = self.get_calibration_samples()
+        if new_sample is not None:
+            samples.append(new_sample)
+        if not samples:
+            return
+        
+        start = time.perf_counter()
+        _, (pixels_per_meter,) = fit_calibration('scale', samples, [self.calibration_pixels_per_meter])
+        
+        positioned = [sample for sample in samples if sample['x'] is not None]
+        model = None
+        if len(positioned) >= CALIBRATION_MIN_POSITIONED:
+            if self.camera_model_enabled:
+                model = 'camera'
+                _, (fov, height, pitch) = fit_calibration(
+                    'camera', samples, [self.camera_fov, self.camera_height, self.camera_pitch],
+                    self.get_calibration_pool()
+                )
+                # Округляем до шага ползунков, чтобы они не исказили результат
+                self.camera_fov = round(fov)
+                self.camera_height = round(height, 2)
+                self.camera_pitch = round(pitch, 1)
+                layer['camera_fov'] = self.camera_fov
+                self.fov_scale.set(self.camera_fov)
+                self.camera_height_scale.set(self.camera_height)
+                self.pitch_scale.set(self.camera_pitch)
+            elif self.perspective_enabled:
+                model = 'ellipse'
+                _, (pixels_per_meter, horizon_offset, ratio) = fit_calibration(
+                    'ellipse', samples, [pixels_per_meter, self.horizon_offset, self.perspective_ratio],
+                    self.get_calibration_pool()
+                )
+                self.horizon_offset = round(horizon_offset, 2)
+                self.perspective_ratio = round(ratio, 2)
+                self.horizon_scale.set(self.horizon_offset)
+                self.ratio_scale.set(self.perspective_ratio)
+        
+        self.calibration_pixels_per_meter = pixels_per_meter
+        layer['calibration_pixels_per_meter'] = pixels_per_meter
+        
+        if new_sample is not None:
+            stored = layer.setdefault('calibration_samples', [])
+            stored.append(new_sample)
+            del stored[:-CALIBRATION_MAX_SAMPLES]
+        
+        print(f"Подгонка калибровки: {len(samples)} точек ({len(positioned)} с позицией), "
+              f"модель {model or 'scale'}, {(time.perf_counter() - start) * 1000:.0f} мс")
+    
+    def clear_calibration_samples(self):
+        """Забыть накопленные точки калибровки текущего уровня зума"""
+        self.zoom_layers[self.active_zoom_layer]['calibration_samples'] = []
+        self.update_calibration_info()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def update_calibration_info(self):
+        """Обновить подпись калибровки в окне управления"""
+        count = len(self.zoom_layers[self.active_zoom_layer].get('calibration_samples', []))
+        self.calibration_info.config(
+            text=f"Калибровка: {self.calibration_pixels_per_meter:.1f} пикс/метр (точек: {count})"
+        )
+    
     def toggle_overlay(self):
         """Включить/выключить оверлей"""
         if self.calibration_mode:
@@ -565,77 +1177,11 @@ class DistanceOverlay:
         if not self.overlay_enabled:
             return
         
-        # Вычисляем горизонт относительно позиции ног
-        horizon_y = self.foot_position_y - (self.screen_height * self.horizon_offset)
-        
-        # Рисуем круги для каждой дистанции
-        for i, distance in enumerate(self.distances):
-            if distance <= 0:
-                continue
-                
-            radius = distance * self.calibration_pixels_per_meter
-            color = self.circle_colors[i % len(self.circle_colors)]
-            
-            if self.perspective_enabled:
-                # Рисуем эллипс с перспективой
-                # Горизонтальный радиус остается тем же
-                radius_x = radius
-                # Вертикальный радиус сжимается для создания перспективы
-                radius_y = radius * self.perspective_ratio
-                
-                # Центр эллипса находится в позиции ног игрока
-                # Чем дальше дистанция, тем выше к горизонту поднимается эллипс
-                distance_factor = min(distance / 50.0, 1.0)  # Нормализуем до 50 метров
-                ellipse_center_y = self.foot_position_y - (distance_factor * (self.foot_position_y - horizon_y))
-                
-                # Рисуем эллипс
-                self.canvas.create_oval(
-                    self.center_x - radius_x,
-                    ellipse_center_y - radius_y,
-                    self.center_x + radius_x,
-                    ellipse_center_y + radius_y,
-                    outline=color,
-                    width=2,
-                    tags='distance_circle'
-                )
-                
-                # Подпись дистанции (размещаем над эллипсом)
-                text_y = ellipse_center_y - radius_y - 15
-                
-            else:
-                # Рисуем обычный круг с центром в позиции ног
-                self.canvas.create_oval(
-                    self.center_x - radius,
-                    self.foot_position_y - radius,
-                    self.center_x + radius,
-                    self.foot_position_y + radius,
-                    outline=color,
-                    width=2,
-                    tags='distance_circle'
-                )
-                text_y = self.foot_position_y - radius - 15
-            
-            # Подпись дистанции (с контуром для лучшей видимости)
-            text_content = f"{distance}м"
-            # Контур текста
-            for dx, dy in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
-                self.canvas.create_text(
-                    self.center_x + dx,
-                    text_y + dy,
-                    text=text_content,
-                    fill='black',
-                    font=('Arial', 10, 'bold'),
-                    tags='distance_circle'
-                )
-            # Основной текст
-            self.canvas.create_text(
-                self.center_x,
-                text_y,
-                text=text_content,
-                fill=color,
-                font=('Arial', 10, 'bold'),
-                tags='distance_circle'
-            )
+        # Кольца всех уровней зума рисуются сразу; виден только активный,
+        # поэтому переключение зума не требует перерисовки
+        self.marker_grids = {}
+        for index in range(len(self.zoom_layers)):
+            self.draw_zoom_layer(index)
         
         # Центральная точка (прицел) - остается в центре экрана
         self.canvas.create_oval(
@@ -647,30 +1193,945 @@ class DistanceOverlay:
             outline='white',
             tags='distance_circle'
         )
+        
+        # Возвращаем подпись дальномера, удаленную вместе с остальным canvas
+        if self.range_finder_enabled:
+            self.update_range_finder()
     
-    def update_distances(self):
-        """Обновить дистанции из полей ввода"""
-        new_distances = []
+    def draw_zoom_layer(self, index):
+        """Рисование колец одного уровня зума (скрыты, если уровень не активен)"""
+        # Рисуем круги для каждой дистанции
+        for i in range(len(self.distances)):
+            self.draw_ring(i, index)
         
-        for entry in self.distance_entries:
-            try:
-                dist = float(entry.get())
-                if dist > 0:
-                    new_distances.append(dist)
-                else:
-                    new_distances.append(0)
-            except ValueError:
-                new_distances.append(0)
+        # Маркеры на земле этого уровня и их индекс для попаданий
+        self.marker_grids[index] = MarkerGrid(MARKER_GRID_CELL)
+        for marker in self.markers.values():
+            self.draw_marker(marker, index)
+    
+    def draw_ring(self, i, index):
+        """Рисование одного кольца дистанции на уровне зума
+        
+        Элементы кольца помечены тегом ring_<i>, чтобы правка одной дистанции
+        перерисовывала только ее кольцо.
+        """
+        distance = self.distances[i]
+        if distance <= 0:
+            return
         
-        self.distances = new_distances
+        tags = ('distance_circle', f'zoom_layer_{index}', f'ring_{i}')
+        state = 'normal' if index == self.active_zoom_layer else 'hidden'
+        layer = self.zoom_layers[index]
+        pixels_per_meter, _ = self.get_layer_optics(layer)
         
-        # Перерисовываем круги если оверлей включен
+        # Вычисляем горизонт относительно позиции ног
+        horizon_y = self.foot_position_y - (self.screen_height * self.horizon_offset)
+        
+        radius = distance * pixels_per_meter
+        color = self.circle_colors[i % len(self.circle_colors)]
+        
+        if self.camera_model_enabled:
+            # Кольцо на земле, спроецированное моделью камеры в ломаную
+            polyline = self.get_ring_polyline(distance, layer)
+            if len(polyline) < 4:
+                return  # Кольцо целиком за камерой
+            
+            self.canvas.create_line(
+                *polyline,
+                fill=color,
+                width=2,
+                tags=tags,
+                state=state
+            )
+            
+            # Подпись над ближайшей к прицелу точкой кольца (прямо по курсу)
+            text_y = self.project_ground_point(distance, 0.0, layer)[1] - 15
+        
+        elif self.perspective_enabled:
+            # Рисуем эллипс с перспективой
+            # Горизонтальный радиус остается тем же
+            radius_x = radius
+            # Вертикальный радиус сжимается для создания перспективы
+            radius_y = radius * self.perspective_ratio
+            
+            # Центр эллипса находится в позиции ног игрока
+            # Чем дальше дистанция, тем выше к горизонту поднимается эллипс
+            distance_factor = min(distance / 50.0, 1.0)  # Нормализуем до 50 метров
+            ellipse_center_y = self.foot_position_y - (distance_factor * (self.foot_position_y - horizon_y))
+            
+            # Рисуем эллипс
+            self.canvas.create_oval(
+                self.center_x - radius_x,
+                ellipse_center_y - radius_y,
+                self.center_x + radius_x,
+                ellipse_center_y + radius_y,
+                outline=color,
+                width=2,
+                tags=tags,
+                state=state
+            )
+            
+            # Подпись дистанции (размещаем над эллипсом)
+            text_y = ellipse_center_y - radius_y - 15
+            
+        else:
+            # Рисуем обычный круг с центром в позиции ног
+            self.canvas.create_oval(
+                self.center_x - radius,
+                self.foot_position_y - radius,
+                self.center_x + radius,
+                self.foot_position_y + radius,
+                outline=color,
+                width=2,
+                tags=tags,
+                state=state
+            )
+            text_y = self.foot_position_y - radius - 15
+        
+        # Подпись дистанции (с контуром для лучшей видимости)
+        text_content = f"{distance}м"
+        # Контур текста
+        for dx, dy in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
+            self.canvas.create_text(
+                self.center_x + dx,
+                text_y + dy,
+                text=text_content,
+                fill='black',
+                font=('Arial', 10, 'bold'),
+                tags=tags,
+                state=state
+            )
+        # Основной текст
+        self.canvas.create_text(
+            self.center_x,
+            text_y,
+            text=text_content,
+            fill=color,
+            font=('Arial', 10, 'bold'),
+            tags=tags,
+            state=state
+        )
+    
+    def get_layer_optics(self, layer=None):
+        """(пикс/метр, FOV) уровня зума; без уровня - значения активного
+        
+        Неактивные уровни рисуются со своими значениями, не трогая
+        calibration_pixels_per_meter и camera_fov приложения.
+        """
+        if layer is None:
+            return self.calibration_pixels_per_meter, self.camera_fov
+        return layer['calibration_pixels_per_meter'], layer['camera_fov']
+    
+    def get_camera_state(self, layer=None):
+        """Параметры, от которых зависит проекция колец (ключ кэша ломаных)"""
+        return (
+            self.get_layer_optics(layer)[1],
+            self.camera_height,
+            self.camera_pitch,
+            self.center_x,
+            self.crosshair_y,
+            self.screen_width,
+            self.screen_height,
+            self.tessellation_tolerance
+        )
+    
+    def get_focal_length(self, layer=None):
+        """Фокусное расстояние камеры в пикселях из вертикального FOV"""
+        _, fov = self.get_layer_optics(layer)
+        return (self.screen_height / 2) / math.tan(math.radians(fov) / 2)
+    
+    def project_ground_point(self, distance, angle, layer=None):
+        """Проекция точки земли (дистанция от ног, азимут в радианах) на экран
+        
+        Камера висит на высоте camera_height над ногами и наклонена вниз на
+        camera_pitch. Возвращает (x, y) или None, если точка позади камеры.
+        """
+        pitch = math.radians(self.camera_pitch)
+        forward = distance * math.cos(angle)
+        side = distance * math.sin(angle)
+        
+        # Переход в систему координат камеры
+        depth = forward * math.cos(pitch) + self.camera_height * math.sin(pitch)
+        if depth <= CAMERA_NEAR_PLANE:
+            return None
+        up = forward * math.sin(pitch) - self.camera_height * math.cos(pitch)
+        
+        focal = self.get_focal_length(layer)
+        return (
+            self.center_x + focal * side / depth,
+            self.crosshair_y - focal * up / depth
+        )
+    
+    def get_visible_arc(self, distance):
+        """Диапазон азимутов кольца перед плоскостью отсечения камеры
+        
+        Возвращает (начало, конец) в радианах или None, если кольцо не видно.
+        """
+        pitch = math.radians(self.camera_pitch)
+        # depth > near  <=>  distance * cos(angle) > min_forward
+        min_forward = (CAMERA_NEAR_PLANE - self.camera_height * math.sin(pitch)) / math.cos(pitch)
+        ratio = min_forward / distance
+        
+        if ratio >= 1.0:
+            return None
+        if ratio < -1.0:
+            return (-math.pi, math.pi)  # Кольцо видно целиком
+        
+        half_angle = math.acos(ratio) * (1.0 - 1e-6)
+        return (-half_angle, half_angle)
+    
+    def tessellate_ring(self, distance, layer=None):
+        """Адаптивное разбиение видимой дуги кольца в ломаную экранных координат
+        
+        Отрезок делится пополам, пока середина дуги отстоит от хорды больше
+        чем на tessellation_tolerance пикселей. Расстояние берется до самой
+        хорды, а не до ее середины: x на экране не пропорционален углу, и
+        середина почти прямого участка все равно смещена вдоль хорды. Близкие
+        кольца получают много сегментов, дальние - несколько.
+        """
+        arc = self.get_visible_arc(distance)
+        if arc is None:
+            return []
+        
+        start, end = arc
+        closed = end - start >= 2 * math.pi
+        margin = CAMERA_OFFSCREEN_MARGIN
+        screen_left = -margin
+        screen_top = -margin
+        screen_right = self.screen_width + margin
+        screen_bottom = self.screen_height + margin
+        
+        step = (end - start) / TESSELLATION_INITIAL_SEGMENTS
+        angles = [start + step * k for k in range(TESSELLATION_INITIAL_SEGMENTS + 1)]
+        points = [self.project_ground_point(distance, angle, layer) for angle in angles]
+        
+        coords = list(points[0])
+        for k in range(TESSELLATION_INITIAL_SEGMENTS):
+            # Обход в глубину: на стеке лежат ещё не выведенные правые половины
+            stack = [(angles[k], points[k], angles[k + 1], points[k + 1], 0)]
+            while stack:
+                a0, p0, a1, p1, depth = stack.pop()
+                if depth < TESSELLATION_MAX_DEPTH:
+                    mid_angle = (a0 + a1) / 2
+                    mid = self.project_ground_point(distance, mid_angle, layer)
+                    error = self.distance_to_segment(mid, p0, p1)
+                    
+                    # Участки целиком за пределами экрана не детализируем
+                    xs = (p0[0], p1[0], mid[0])
+                    ys = (p0[1], p1[1], mid[1])
+                    offscreen = (
+                        max(xs) < screen_left or min(xs) > screen_right or
+                        max(ys) < screen_top or min(ys) > screen_bottom
+                    )
+                    
+                    if error > self.tessellation_tolerance and not offscreen:
+                        stack.append((mid_angle, mid, a1, p1, depth + 1))
+                        stack.append((a0, p0, mid_angle, mid, depth + 1))
+                        continue
+                coords.extend(p1)
+        
+        if closed:
+            coords[-2:] = coords[:2]  # Замыкаем кольцо точно в начальной точке
+            return coords
+        
+        # Концы дуги у плоскости отсечения уходят далеко за экран - обрезаем их,
+        # оставляя по одной точке за краем, чтобы линия доходила до границы
+        def outside(k):
+            x, y = coords[2 * k], coords[2 * k + 1]
+            return x < screen_left or x > screen_right or y < screen_top or y > screen_bottom
+        
+        count = len(coords) // 2
+        first = 0
+        while first < count - 1 and outside(first) and outside(first + 1):
+            first += 1
+        last = count - 1
+        while last > first and outside(last) and outside(last - 1):
+            last -= 1
+        return coords[2 * first:2 * last + 2]
+    
+    def distance_to_segment(self, point, p0, p1):
+        """Расстояние от точки до отрезка p0-p1 на экране (пиксели)"""
+        dx = p1[0] - p0[0]
+        dy = p1[1] - p0[1]
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            return math.hypot(point[0] - p0[0], point[1] - p0[1])
+        
+        # Проекция на отрезок: перпендикуляр, если он падает внутрь, иначе ближний конец
+        t = ((point[0] - p0[0]) * dx + (point[1] - p0[1]) * dy) / length_sq
+        t = max(0.0, min(1.0, t))
+        return math.hypot(point[0] - (p0[0] + t * dx), point[1] - (p0[1] + t * dy))
+    
+    def get_ring_polyline(self, distance, layer=None):
+        """Ломаная кольца из кэша (пересчитывается только при смене камеры)"""
+        state = self.get_camera_state(layer)
+        polylines = self.ring_polyline_cache.get(state)
+        if polylines is None:
+            # Несколько состояний сразу: каждый уровень зума рисуется со своим FOV
+            if len(self.ring_polyline_cache) >= RING_CACHE_STATES:
+                del self.ring_polyline_cache[next(iter(self.ring_polyline_cache))]
+            polylines = self.ring_polyline_cache[state] = {}
+        
+        polyline = polylines.get(distance)
+        if polyline is None:
+            polyline = self.tessellate_ring(distance, layer)
+            polylines[distance] = polyline
+        return polyline
+    
+    def toggle_range_finder(self, enabled=None):
+        """Включить/выключить дальномер под курсором"""
+        if enabled is None:
+            enabled = self.range_finder_var.get()
+        self.range_finder_enabled = enabled
+        self.range_finder_var.set(enabled)
+        
+        if enabled:
+            self.bind_range_finder()
+        else:
+            self.canvas.unbind('<Motion>')
+            self.canvas.unbind('<Leave>')
+            if self.pointer_poll_job is not None:
+                self.root.after_cancel(self.pointer_poll_job)
+                self.pointer_poll_job = None
+            self.hide_range_finder()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def bind_range_finder(self):
+        """Привязать события мыши на оверлее к дальномеру"""
+        import platform
+        if platform.system() == 'Windows':
+            # Черный цвет оверлея прозрачен для мыши (-transparentcolor), и
+            # <Motion> приходит только над нарисованными кольцами - опрашиваем
+            if self.pointer_poll_job is None:
+                self.poll_pointer()
+            return
+        
+        self.canvas.bind('<Motion>', self.on_pointer_motion)
+        self.canvas.bind('<Leave>', lambda e: self.hide_range_finder())
+    
+    def get_pointer_position(self):
+        """Позиция указателя в координатах оверлея или None, если он вне оверлея"""
+        x, y = self.root.winfo_pointerxy()
+        x -= self.canvas.winfo_rootx()
+        y -= self.canvas.winfo_rooty()
+        if 0 <= x < self.screen_width and 0 <= y < self.screen_height:
+            return (x, y)
+        return None
+    
+    def poll_pointer(self):
+        """Опрос указателя для дальномера (замена <Motion> на Windows)"""
+        self.pointer_poll_job = self.root.after(POINTER_POLL_MS, self.poll_pointer)
+        
+        position = self.get_pointer_position()
+        if position is None:
+            if self.pointer_position is not None:
+                self.hide_range_finder()
+        elif position != self.pointer_position:
+            # Через обработчик движения: так опрос попадает и в запись событий
+            event = tk.Event()
+            event.x, event.y = position
+            self.on_pointer_motion(event)
+    
+    def on_pointer_motion(self, event):
+        """Запомнить позицию указателя и запланировать одно обновление подписи
+        
+        <Motion> приходит сотнями в секунду. Вместо перерисовки на каждое
+        событие обновление откладывается через after_idle: Tk сначала разберет
+        всю очередь событий, и подпись будет нарисована по самой свежей позиции.
+        """
+        self.pointer_position = (event.x, event.y)
+        if self.range_finder_job is None:
+            self.range_finder_job = self.root.after_idle(self.update_range_finder)
+    
+    def hide_range_finder(self):
+        """Убрать подпись дальномера"""
+        if self.range_finder_job is not None:
+            self.root.after_cancel(self.range_finder_job)
+            self.range_finder_job = None
+        self.pointer_position = None
+        self.canvas.delete('range_finder')
+        self.range_finder_anchor = None
+    
+    def update_range_finder(self):
+        """Показать дистанцию до точки земли под указателем"""
+        self.range_finder_job = None
+        if not self.range_finder_enabled or self.calibration_mode or self.pointer_position is None:
+            return
+        
+        x, y = self.pointer_position
+        distance = self.ground_distance_at(x, y)
+        text = "∞" if distance is None else f"{distance:.1f}м"
+        
+        anchor_x = x + RANGE_FINDER_OFFSET
+        anchor_y = y + RANGE_FINDER_OFFSET
+        
+        if self.range_finder_anchor is None:
+            # Подпись с контуром, как у колец; дальше только двигаем готовые элементы
+            for dx, dy in [(-1,-1), (-1,0), (-1,1), (0,-1), (0,1), (1,-1), (1,0), (1,1)]:
+                self.canvas.create_text(
+                    anchor_x + dx,
+                    anchor_y + dy,
+                    text=text,
+                    fill='black',
+                    anchor='nw',
+                    font=('Arial', 11, 'bold'),
+                    tags='range_finder'
+                )
+            self.canvas.create_text(
+                anchor_x,
+                anchor_y,
+                text=text,
+                fill='white',
+                anchor='nw',
+                font=('Arial', 11, 'bold'),
+                tags='range_finder'
+            )
+        else:
+            # Одна команда на перемещение и одна на текст для всех элементов подписи
+            old_x, old_y = self.range_finder_anchor
+            self.canvas.move('range_finder', anchor_x - old_x, anchor_y - old_y)
+            if text != self.range_finder_text:
+                self.canvas.itemconfig('range_finder', text=text)
+        
+        self.range_finder_anchor = (anchor_x, anchor_y)
+        self.range_finder_text = text
+    
+    def get_inverse_projection_state(self):
+        """Параметры, от которых зависит таблица обратной проекции"""
+        return (
+            self.camera_model_enabled,
+            self.perspective_enabled,
+            self.calibration_pixels_per_meter,
+            self.horizon_offset,
+            self.perspective_ratio,
+            self.foot_position_y,
+            self.get_camera_state()
+        )
+    
+    def build_inverse_row(self, y):
+        """Строка таблицы обратной проекции для экранной строки y
+        
+        Для модели камеры строка луча однозначно задает дистанцию вперед по
+        земле и масштаб метров на пиксель вбок. Для эвристики перспективы
+        хранятся накопленные максимумы g(d) = (d*ppm)^2 - ((y - центр(d)) / сжатие)^2
+        на сетке дистанций: точка (dx, y) лежит внутри эллипса d при g(d) >= dx^2.
+        """
+        if self.camera_model_enabled:
+            pitch = math.radians(self.camera_pitch)
+            focal = self.get_focal_length()
+            v = (self.crosshair_y - y) / focal
+            denominator = math.sin(pitch) - v * math.cos(pitch)
+            if denominator <= 0:
+                return None  # Выше горизонта луч не пересекает землю
+            scale = self.camera_height / denominator
+            return (scale * (math.cos(pitch) + v * math.sin(pitch)), scale / focal)
+        
+        pixels_per_meter = self.calibration_pixels_per_meter
+        ratio = self.perspective_ratio
+        horizon_y = self.foot_position_y - (self.screen_height * self.horizon_offset)
+        lift_per_meter = (self.foot_position_y - horizon_y) / 50.0
+        offset_y = y - self.foot_position_y
+        
+        steps = int(round(50.0 / RANGE_FINDER_GRID_STEP))
+        best = -math.inf
+        prefix = []
+        for k in range(steps + 1):
+            d = k * RANGE_FINDER_GRID_STEP
+            g = (d * pixels_per_meter) ** 2 - ((offset_y + d * lift_per_meter) / ratio) ** 2
+            best = max(best, g)
+            prefix.append(best)
+        
+        # Дальше 50 м эллипс стоит на горизонте и только растет
+        far_offset = (y - horizon_y) / ratio
+        return (prefix, far_offset)
+    
+    def ground_distance_at(self, x, y):
+        """Дистанция по земле до точки экрана (обратная проекция колец)
+        
+        Возвращает метры или None, если точка выше горизонта.
+        """
+        dx = x - self.center_x
+        
+        if not self.camera_model_enabled and not self.perspective_enabled:
+            # Обычные круги: дистанция пропорциональна радиусу
+            return math.hypot(dx, y - self.foot_position_y) / self.calibration_pixels_per_meter
+        
+        state = self.get_inverse_projection_state()
+        if state != self.inverse_table_key:
+            self.inverse_table = {}
+            self.inverse_table_key = state
+        
+        row = int(y)
+        if row not in self.inverse_table:
+            self.inverse_table[row] = self.build_inverse_row(row)
+        entry = self.inverse_table[row]
+        if entry is None:
+            return None
+        
+        if self.camera_model_enabled:
+            forward, meters_per_pixel = entry
+            return math.hypot(forward, dx * meters_per_pixel)
+        
+        prefix, far_offset = entry
+        target = dx * dx
+        k = bisect_left(prefix, target)
+        if k == 0:
+            return 0.0
+        if k == len(prefix):
+            return math.sqrt(target + far_offset ** 2) / self.calibration_pixels_per_meter
+        
+        # Линейная интерполяция между соседними узлами сетки
+        t = (target - prefix[k - 1]) / (prefix[k] - prefix[k - 1])
+        return (k - 1 + t) * RANGE_FINDER_GRID_STEP
+    
+    def get_ellipse_center_y(self, distance):
+        """Центр эллипса дистанции в эвристической перспективе"""
+        horizon_y = self.foot_position_y - (self.screen_height * self.horizon_offset)
+        distance_factor = min(distance / 50.0, 1.0)
+        return self.foot_position_y - (distance_factor * (self.foot_position_y - horizon_y))
+    
+    def ground_to_screen(self, distance, angle, layer=None):
+        """Точка земли (дистанция от ног, азимут) в координаты экрана текущей модели
+        
+        Возвращает None, если точка не видна.
+        """
+        if self.camera_model_enabled:
+            return self.project_ground_point(distance, angle, layer)
+        
+        radius = distance * self.get_layer_optics(layer)[0]
+        if self.perspective_enabled:
+            return (
+                self.center_x + radius * math.sin(angle),
+                self.get_ellipse_center_y(distance) - radius * self.perspective_ratio * math.cos(angle)
+            )
+        return (
+            self.center_x + radius * math.sin(angle),
+            self.foot_position_y - radius * math.cos(angle)
+        )
+    
+    def screen_to_ground(self, x, y):
+        """Обратное к ground_to_screen: (дистанция, азимут) или None выше горизонта"""
+        distance = self.ground_distance_at(x, y)
+        if distance is None:
+            return None
+        if distance == 0:
+            return (0.0, 0.0)
+        
+        dx = x - self.center_x
+        if self.camera_model_enabled:
+            forward, meters_per_pixel = self.inverse_table[int(y)]
+            return (distance, math.atan2(dx * meters_per_pixel, forward))
+        if self.perspective_enabled:
+            radius = distance * self.calibration_pixels_per_meter
+            return (distance, math.atan2(dx / radius, (self.get_ellipse_center_y(distance) - y) / (radius * self.perspective_ratio)))
+        return (distance, math.atan2(dx, self.foot_position_y - y))
+    
+    def draw_marker(self, marker, index):
+        """Нарисовать маркер на уровне зума index и обновить его позицию в индексе"""
+        grid = self.marker_grids[index]
+        layer = self.zoom_layers[index]
+        point = self.ground_to_screen(marker['distance'], marker['angle'], layer)
+        if point is None:
+            grid.remove(marker['id'])
+            return
+        grid.insert(marker['id'], *point)
+        
+        tags = ('distance_circle', f'zoom_layer_{index}', 'marker', f"marker_{marker['id']}")
+        state = 'normal' if index == self.active_zoom_layer else 'hidden'
+        
+        # Зона попадания радиусом MARKER_HIT_RADIUS: на Windows щелчки ловят
+        # только нарисованные пиксели, а точка и кольца маркера слишком тонкие.
+        # Лежит под всеми кольцами, чтобы их не закрывать
+        x, y = point
+        hit_item = self.canvas.create_oval(
+            x - MARKER_HIT_RADIUS, y - MARKER_HIT_RADIUS,
+            x + MARKER_HIT_RADIUS, y + MARKER_HIT_RADIUS,
+            fill=MARKER_HIT_COLOR, outline='', tags=tags + ('marker_hit',), state=state
+        )
+        self.canvas.tag_lower(hit_item)
+        
+        # Кольца маркера - окружности на земле вокруг его точки
+        forward = marker['distance'] * math.cos(marker['angle'])
+        side = marker['distance'] * math.sin(marker['angle'])
+        for ring_radius in MARKER_RING_RADII:
+            coords = []
+            for k in range(MARKER_RING_SEGMENTS + 1):
+                phi = 2 * math.pi * k / MARKER_RING_SEGMENTS
+                ring_forward = forward + ring_radius * math.cos(phi)
+                ring_side = side + ring_radius * math.sin(phi)
+                ring_point = self.ground_to_screen(math.hypot(ring_forward, ring_side), math.atan2(ring_side, ring_forward), layer)
+                if ring_point is None:
+                    break  # Кольцо заходит за камеру - не рисуем
+                coords.extend(ring_point)
+            else:
+                self.canvas.create_line(*coords, fill=MARKER_COLOR, width=1, tags=tags, state=state)
+        
+        self.canvas.create_oval(x - 3, y - 3, x + 3, y + 3, fill=MARKER_COLOR, outline=MARKER_COLOR, tags=tags, state=state)
+        
+        # Подпись с тенью (два элемента вместо девяти - маркеров могут быть сотни)
+        text_content = f"{marker['name']} {marker['distance']:.1f}м"
+        self.canvas.create_text(x + 1, y - 13, text=text_content, fill='black', font=('Arial', 9, 'bold'), tags=tags, state=state)
+        self.canvas.create_text(x, y - 14, text=text_content, fill=MARKER_COLOR, font=('Arial', 9, 'bold'), tags=tags, state=state)
+    
+    def redraw_marker(self, marker_id):
+        """Перерисовать один маркер на всех уровнях зума без перерисовки остального"""
+        if not self.overlay_enabled:
+            return
+        
+        self.canvas.delete(f'marker_{marker_id}')
+        marker = self.markers.get(marker_id)
+        if marker is None:
+            # Маркер удален - убираем его из индексов
+            for grid in self.marker_grids.values():
+                grid.remove(marker_id)
+            return
+        
+        for index in range(len(self.zoom_layers)):
+            self.draw_marker(marker, index)
+    
+    def find_marker(self, x, y):
+        """Маркер под точкой экрана (поиск по сетке активного уровня)"""
+        grid = self.marker_grids.get(self.active_zoom_layer)
+        return grid.nearest(x, y, MARKER_HIT_RADIUS) if grid else None
+    
+    def toggle_markers(self, enabled=None):
+        """Включить/выключить редактирование маркеров щелчками"""
+        if enabled is None:
+            enabled = self.markers_var.get()
+        
+        # Обработчики мыши могут остаться привязанными (во время калибровки
+        # отвязка пропускается) и сами проверяют флаг, поэтому начатое
+        # перетаскивание завершаем, пока режим еще включен
+        if not enabled and self.dragged_marker is not None:
+            self.on_marker_release(None)
+        self.markers_enabled = enabled
+        self.markers_var.set(enabled)
+        
+        if enabled:
+            self.bind_markers()
+        elif not self.calibration_mode:
+            self.canvas.unbind('<Button-1>')
+            self.canvas.unbind('<B1-Motion>')
+            self.canvas.unbind('<ButtonRelease-1>')
+            self.canvas.unbind('<Button-3>')
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def bind_markers(self):
+        """Привязать события мыши на оверлее к маркерам"""
+        self.canvas.bind('<Button-1>', self.on_marker_press)
+        self.canvas.bind('<B1-Motion>', self.on_marker_drag)
+        self.canvas.bind('<ButtonRelease-1>', self.on_marker_release)
+        self.canvas.bind('<Button-3>', self.on_marker_delete)
+    
+    def on_marker_press(self, event):
+        """Щелчок: взять маркер под курсором или поставить новый"""
+        if not self.markers_enabled or not self.overlay_enabled or self.calibration_mode:
+            return
+        
+        marker_id = self.find_marker(event.x, event.y)
+        if marker_id is None:
+            marker_id = self.add_marker(event.x, event.y)
+            if marker_id is None:
+                return
+        
+        self.dragged_marker = marker_id
+    
+    def add_marker(self, x, y):
+        """Поставить маркер в точку земли под экранной точкой, вернуть его id"""
+        ground = self.screen_to_ground(x, y)
+        if ground is None:
+            return None  # Выше горизонта земли нет
+        
+        marker_id = self.next_marker_id
+        self.next_marker_id += 1
+        self.markers[marker_id] = {
+            'id': marker_id,
+            'name': f"M{marker_id}",
+            'distance': ground[0],
+            'angle': ground[1]
+        }
+        self.redraw_marker(marker_id)
+        return marker_id
+    
+    def drop_marker_at_pointer(self):
+        """Поставить маркер под указателем (F6)
+        
+        На Windows щелчок по пустой земле проходит сквозь оверлей в игру,
+        поэтому новый маркер ставится клавишей. Перетаскивать и удалять
+        маркеры можно мышью: их точки и кольца ловят щелчки.
+        """
+        if not self.overlay_enabled or self.calibration_mode:
+            return
+        
+        position = self.get_pointer_position()
+        if position is None:
+            return
+        if self.add_marker(*position) is not None:
+            # Сохраняем настройки
+            self.save_settings()
+    
+    def on_marker_drag(self, event):
+        """Перетаскивание: как и дальномер, одно обновление на разбор очереди событий"""
+        if not self.markers_enabled or self.dragged_marker is None:
+            return
+        
+        self.drag_position = (event.x, event.y)
+        if self.marker_drag_job is None:
+            self.marker_drag_job = self.root.after_idle(self.apply_marker_drag)
+    
+    def apply_marker_drag(self):
+        """Перенести перетаскиваемый маркер в последнюю позицию указателя"""
+        self.marker_drag_job = None
+        marker = self.markers.get(self.dragged_marker)
+        if marker is None or self.drag_position is None:
+            return
+        
+        ground = self.screen_to_ground(*self.drag_position)
+        if ground is None:
+            return
+        marker['distance'], marker['angle'] = ground
+        self.redraw_marker(marker['id'])
+    
+    def on_marker_release(self, event):
+        """Отпускание кнопки: зафиксировать маркер и сохранить"""
+        if not self.markers_enabled or self.dragged_marker is None:
+            return
+        
+        if self.marker_drag_job is not None:
+            self.root.after_cancel(self.marker_drag_job)
+            self.apply_marker_drag()
+        
+        self.dragged_marker = None
+        self.drag_position = None
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def on_marker_delete(self, event):
+        """Правый щелчок по маркеру - удалить его"""
+        if not self.markers_enabled or not self.overlay_enabled or self.calibration_mode:
+            return
+        
+        marker_id = self.find_marker(event.x, event.y)
+        if marker_id is None:
+            return
+        
+        del self.markers[marker_id]
+        self.redraw_marker(marker_id)
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def clear_markers(self):
+        """Удалить все маркеры"""
+        self.markers = {}
         if self.overlay_enabled:
             self.draw_distance_circles()
         
         # Сохраняем настройки
         self.save_settings()
     
+    def refresh_distance_rows(self):
+        """Заполнить строки редактора дистанциями видимой части списка"""
+        count = len(self.distances)
+        self.distance_first_row = max(0, min(self.distance_first_row, count - DISTANCE_EDITOR_ROWS))
+        
+        for row, (label, entry, button) in enumerate(self.distance_rows):
+            i = self.distance_first_row + row
+            entry.config(state='normal')
+            entry.delete(0, tk.END)
+            if i < count:
+                label.config(text=f"#{i+1}:", fg=self.circle_colors[i % len(self.circle_colors)])
+                entry.insert(0, str(self.distances[i]))
+                button.config(state='normal')
+            else:
+                label.config(text="")
+                entry.config(state='disabled')
+                button.config(state='disabled')
+        
+        if count > 0:
+            self.distance_scrollbar.set(
+                self.distance_first_row / count,
+                min(1.0, (self.distance_first_row + DISTANCE_EDITOR_ROWS) / count)
+            )
+        else:
+            self.distance_scrollbar.set(0.0, 1.0)
+    
+    def scroll_distance_editor(self, *args):
+        """Прокрутка редактора дистанций (команда Scrollbar)"""
+        count = len(self.distances)
+        if args[0] == 'moveto':
+            first_row = int(round(float(args[1]) * count))
+        else:
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= DISTANCE_EDITOR_ROWS
+            first_row = self.distance_first_row + step
+        
+        first_row = max(0, min(first_row, count - DISTANCE_EDITOR_ROWS))
+        if first_row == self.distance_first_row:
+            return
+        
+        # Несохраненные правки видимых строк не должны потеряться при прокрутке
+        self.commit_distance_rows()
+        
+        self.distance_first_row = first_row
+        self.refresh_distance_rows()
+    
+    def on_control_wheel(self, event):
+        """Прокрутка панели управления колесиком мыши"""
+        if event.num == 4 or event.delta > 0:
+            self.control_canvas.yview_scroll(-1, 'units')
+        else:
+            self.control_canvas.yview_scroll(1, 'units')
+    
+    def on_distance_editor_wheel(self, event):
+        """Прокрутка редактора дистанций колесиком мыши"""
+        if event.num == 4 or event.delta > 0:
+            self.scroll_distance_editor('scroll', -1, 'units')
+        else:
+            self.scroll_distance_editor('scroll', 1, 'units')
+        return 'break'
+    
+    def commit_distance_row(self, row):
+        """Применить значение из строки редактора, если оно изменилось"""
+        index = self.distance_first_row + row
+        if index >= len(self.distances):
+            return
+        
+        try:
+            distance = float(self.distance_rows[row][1].get())
+        except ValueError:
+            distance = 0
+        if distance <= 0:
+            distance = 0
+        
+        if distance != self.distances[index]:
+            self.set_distance(index, distance)
+    
+    def commit_distance_rows(self):
+        """Применить правки всех видимых строк редактора
+        
+        Кнопки Tk не забирают фокус, поэтому щелчок по ним не вызывает
+        <FocusOut> у поля, которое еще редактируется.
+        """
+        for row in range(DISTANCE_EDITOR_ROWS):
+            self.commit_distance_row(row)
+    
+    def set_distance(self, index, distance):
+        """Изменить одну дистанцию и перерисовать только ее кольцо"""
+        self.distances[index] = distance
+        self.redraw_rings([index])
+        self.refresh_distance_rows()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def on_add_distance(self):
+        """Кнопка добавления дистанции (с применением несохраненных правок)"""
+        self.commit_distance_rows()
+        self.add_distance()
+    
+    def add_distance(self):
+        """Добавить кольцо в конец списка (на 5 м дальше последнего)"""
+        distance = max(self.distances, default=0) + 5
+        self.distances.append(distance)
+        self.redraw_rings([len(self.distances) - 1])
+        
+        # Показываем новую строку
+        self.distance_first_row = len(self.distances)
+        self.refresh_distance_rows()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def on_add_distance_range(self):
+        """Прочитать поля генератора диапазона и добавить кольца"""
+        self.commit_distance_rows()
+        
+        try:
+            start, stop, step = (float(entry.get()) for entry in self.range_entries)
+        except ValueError:
+            messagebox.showerror("Ошибка", "Введите числа в поля диапазона")
+            return
+        
+        if start <= 0 or step <= 0 or stop < start:
+            messagebox.showerror("Ошибка", "Нужно 0 < от ≤ до и шаг > 0")
+            return
+        if (stop - start) / step + 1 > DISTANCE_RANGE_LIMIT:
+            messagebox.showerror("Ошибка", f"Диапазон дает больше {DISTANCE_RANGE_LIMIT} колец")
+            return
+        
+        self.add_distance_range(start, stop, step)
+    
+    def add_distance_range(self, start, stop, step):
+        """Добавить кольца от start до stop с шагом step (уже заданные пропускаются)"""
+        existing = set(self.distances)
+        first_new = len(self.distances)
+        
+        count = int(math.floor((stop - start) / step + 1e-9)) + 1
+        for k in range(count):
+            # Округление убирает хвосты вроде 10.000000000002 в подписях
+            distance = round(float(start + k * step), 6)
+            if distance.is_integer():
+                distance = int(distance)
+            if distance not in existing:
+                self.distances.append(distance)
+                existing.add(distance)
+        
+        self.redraw_rings(range(first_new, len(self.distances)))
+        self.distance_first_row = first_new
+        self.refresh_distance_rows()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def on_remove_distance_row(self, row):
+        """Кнопка "✕" в строке редактора"""
+        self.commit_distance_rows()
+        self.remove_distance(self.distance_first_row + row)
+    
+    def remove_distance(self, index):
+        """Удалить кольцо из списка
+        
+        Цвет кольца зависит от номера, поэтому перерисовываются удаленное
+        кольцо и все, что стояли после него.
+        """
+        if index >= len(self.distances):
+            return
+        
+        old_count = len(self.distances)
+        del self.distances[index]
+        self.redraw_rings(range(index, old_count))
+        self.refresh_distance_rows()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def redraw_rings(self, indices):
+        """Перерисовать кольца с указанными номерами на всех уровнях зума"""
+        if not self.overlay_enabled:
+            return
+        
+        indices = list(indices)
+        for i in indices:
+            self.canvas.delete(f'ring_{i}')
+        
+        for index in range(len(self.zoom_layers)):
+            for i in indices:
+                if i < len(self.distances):
+                    self.draw_ring(i, index)
+        
+        # Кольца остаются под маркерами, прицелом и подписью дальномера,
+        # но над зонами попадания маркеров
+        for i in indices:
+            self.canvas.tag_lower(f'ring_{i}')
+        self.canvas.tag_lower('marker_hit')
+    
     def toggle_perspective(self):
         """Включить/выключить перспективу"""
         self.perspective_enabled = self.perspective_var.get()
@@ -710,6 +2171,174 @@ class DistanceOverlay:
         # Сохраняем настройки
         self.save_settings()
     
+    def toggle_camera_model(self):
+        """Включить/выключить физическую модель камеры"""
+        self.camera_model_enabled = self.camera_model_var.get()
+        
+        # Перерисовываем круги если оверлей включен
+        if self.overlay_enabled:
+            self.draw_distance_circles()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def update_camera_model(self, value=None):
+        """Обновить параметры модели камеры"""
+        values = (self.fov_scale.get(), self.camera_height_scale.get(), self.pitch_scale.get())
+        if values == (self.camera_fov, self.camera_height, self.camera_pitch):
+            return  # Ползунок выставлен программно (например, при смене уровня зума)
+        
+        self.camera_fov, self.camera_height, self.camera_pitch = values
+        self.zoom_layers[self.active_zoom_layer]['camera_fov'] = self.camera_fov
+        
+        # Перерисовываем круги если оверлей включен (кэш ломаных сбросится сам)
+        if self.overlay_enabled:
+            self.draw_distance_circles()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def apply_zoom_layer(self):
+        """Сделать калибровку активного уровня зума текущей"""
+        layer = self.zoom_layers[self.active_zoom_layer]
+        self.calibration_pixels_per_meter = layer['calibration_pixels_per_meter']
+        self.camera_fov = layer['camera_fov']
+    
+    def switch_zoom_layer(self, index):
+        """Переключить уровень зума без перерисовки
+        
+        Кольца всех уровней уже лежат на canvas, переключение только скрывает
+        элементы старого уровня и показывает элементы нового.
+        """
+        if index == self.active_zoom_layer or not 0 <= index < len(self.zoom_layers):
+            return
+        
+        previous = self.active_zoom_layer
+        self.active_zoom_layer = index
+        self.apply_zoom_layer()
+        
+        if self.overlay_enabled and not self.calibration_mode:
+            self.canvas.itemconfigure(f'zoom_layer_{previous}', state='hidden')
+            self.canvas.itemconfigure(f'zoom_layer_{index}', state='normal')
+        
+        # Дистанция под курсором зависит от калибровки
+        if self.range_finder_enabled:
+            self.update_range_finder()
+        
+        self.update_zoom_widgets()
+    
+    def select_zoom_layer(self, selection):
+        """Выбор уровня зума в окне управления"""
+        try:
+            self.switch_zoom_layer(int(selection.split(':')[0]))
+        except ValueError as e:
+            print(f"Ошибка при смене уровня зума: {e}")
+    
+    def add_zoom_layer(self):
+        """Добавить уровень зума с копией текущей калибровки"""
+        name = simpledialog.askstring(
+            "Уровень зума",
+            "Название уровня (например, ADS или Оптика x4).\n"
+            "После добавления откалибруйте его (F1):"
+        )
+        if not name:
+            return
+        
+        # Точки калибровки другого зума к новому уровню не относятся
+        layer = dict(self.zoom_layers[self.active_zoom_layer], name=name, calibration_samples=[])
+        self.zoom_layers.append(layer)
+        self.active_zoom_layer = len(self.zoom_layers) - 1
+        self.apply_zoom_layer()
+        self.refresh_zoom_menu()
+        
+        # Новому уровню нужны свои элементы на canvas
+        if self.overlay_enabled:
+            self.draw_distance_circles()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def remove_zoom_layer(self):
+        """Удалить активный уровень зума"""
+        if len(self.zoom_layers) == 1:
+            messagebox.showerror("Ошибка", "Нельзя удалить единственный уровень зума!")
+            return
+        
+        del self.zoom_layers[self.active_zoom_layer]
+        self.active_zoom_layer = max(0, self.active_zoom_layer - 1)
+        self.apply_zoom_layer()
+        self.refresh_zoom_menu()
+        
+        # Номера уровней в тегах сдвинулись
+        if self.overlay_enabled:
+            self.draw_distance_circles()
+        
+        # Сохраняем настройки
+        self.save_settings()
+    
+    def refresh_zoom_menu(self):
+        """Пересобрать список уровней зума в окне управления"""
+        menu = self.zoom_combo['menu']
+        menu.delete(0, 'end')
+        for i, layer in enumerate(self.zoom_layers):
+            label = f"{i}: {layer['name']}"
+            menu.add_command(label=label, command=tk._setit(self.zoom_var, label, self.select_zoom_layer))
+        self.update_zoom_widgets()
+    
+    def update_zoom_widgets(self):
+        """Показать в окне управления параметры активного уровня зума"""
+        layer = self.zoom_layers[self.active_zoom_layer]
+        self.zoom_var.set(f"{self.active_zoom_layer}: {layer['name']}")
+        self.update_calibration_info()
+        self.fov_scale.set(self.camera_fov)
+    
+    def start_ipc_listener(self, port):
+        """Принимать команды по UDP на localhost (для макросов и скриптов игры)
+        
+        Поток только складывает команды в очередь, разбираются они в mainloop.
+        """
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('127.0.0.1', port))
+        except OSError as e:
+            print(f"Не удалось открыть порт IPC {port}: {e}")
+            return
+        
+        def listen():
+            while True:
+                data, _ = sock.recvfrom(1024)
+                self.ipc_queue.put(data.decode('utf-8', errors='replace').strip())
+        
+        Thread(target=listen, name='ipc-listener', daemon=True).start()
+        self.root.after(IPC_POLL_MS, self.poll_ipc)
+        print(f"Команды IPC принимаются на 127.0.0.1:{port}")
+    
+    def poll_ipc(self):
+        """Выполнить команды, принятые потоком IPC"""
+        while not self.ipc_queue.empty():
+            self.handle_ipc_command(self.ipc_queue.get_nowait())
+        self.root.after(IPC_POLL_MS, self.poll_ipc)
+    
+    def handle_ipc_command(self, command):
+        """Команды: 'zoom next', 'zoom <номер>', 'zoom <название>'"""
+        parts = command.split(maxsplit=1)
+        if len(parts) != 2 or parts[0] != 'zoom':
+            print(f"Неизвестная команда IPC: {command}")
+            return
+        
+        target = parts[1]
+        if target == 'next':
+            self.switch_zoom_layer((self.active_zoom_layer + 1) % len(self.zoom_layers))
+        elif target.isdigit():
+            self.switch_zoom_layer(int(target))
+        else:
+            for i, layer in enumerate(self.zoom_layers):
+                if layer['name'] == target:
+                    self.switch_zoom_layer(i)
+                    break
+            else:
+                print(f"Уровень зума не найден: {target}")
+    
     def change_monitor(self, selection):
         """Сменить монитор"""
         try:
@@ -739,6 +2368,12 @@ class DistanceOverlay:
         # Пересоздаем окно на новом мониторе
         self.setup_window()
         
+        # Привязки мыши жили на старом canvas
+        if self.range_finder_enabled:
+            self.bind_range_finder()
+        if self.markers_enabled:
+            self.bind_markers()
+        
         # Восстанавливаем состояние
         if was_overlay_enabled:
             self.overlay_enabled = True
@@ -756,10 +2391,15 @@ class DistanceOverlay:
     def clear_canvas(self):
         """Очистить canvas"""
         self.canvas.delete('all')
+        self.range_finder_anchor = None
     
-    def save_settings(self):
-        """Сохранить настройки в файл"""
-        settings = {
+    def get_settings(self):
+        """Текущие настройки в виде словаря (формат distance_settings.json)
+        
+        Возвращается независимая копия: списки дистанций, уровней зума и
+        маркеров дальше меняются на месте.
+        """
+        return copy.deepcopy({
             'calibration_pixels_per_meter': self.calibration_pixels_per_meter,
             'distances': self.distances,
             'circle_colors': self.circle_colors,
@@ -767,8 +2407,21 @@ class DistanceOverlay:
             'horizon_offset': self.horizon_offset,
             'perspective_ratio': self.perspective_ratio,
             'foot_position_ratio': self.foot_position_ratio,
+            'camera_model_enabled': self.camera_model_enabled,
+            'camera_fov': self.camera_fov,
+            'camera_height': self.camera_height,
+            'camera_pitch': self.camera_pitch,
+            'range_finder_enabled': self.range_finder_enabled,
+            'zoom_layers': self.zoom_layers,
+            'markers': list(self.markers.values()),
+            'markers_enabled': self.markers_enabled,
+            'active_zoom_layer': self.active_zoom_layer,
             'current_monitor': self.current_monitor
-        }
+        })
+    
+    def save_settings(self):
+        """Сохранить настройки в файл"""
+        settings = self.get_settings()
         
         try:
             with open(self.settings_file, 'w', encoding='utf-8') as f:
@@ -792,13 +2445,37 @@ class DistanceOverlay:
             self.horizon_offset = settings.get('horizon_offset', 0.3)
             self.perspective_ratio = settings.get('perspective_ratio', 0.2)
             self.foot_position_ratio = settings.get('foot_position_ratio', 0.85)
+            self.camera_model_enabled = settings.get('camera_model_enabled', False)
+            self.camera_fov = settings.get('camera_fov', 70.0)
+            self.camera_height = settings.get('camera_height', 1.7)
+            self.camera_pitch = settings.get('camera_pitch', 0.0)
+            self.range_finder_enabled = settings.get('range_finder_enabled', False)
+            
+            # Старые настройки без уровней зума - единственный уровень из общей калибровки
+            self.zoom_layers = settings.get('zoom_layers') or [
+                {
+                    'name': 'Без прицела',
+                    'calibration_pixels_per_meter': self.calibration_pixels_per_meter,
+                    'camera_fov': self.camera_fov
+                }
+            ]
+            self.active_zoom_layer = min(settings.get('active_zoom_layer', 0), len(self.zoom_layers) - 1)
+            self.apply_zoom_layer()
             self.current_monitor = settings.get('current_monitor', 0)
             
+            self.markers = {marker['id']: marker for marker in settings.get('markers', [])}
+            self.next_marker_id = max(self.markers, default=0) + 1
+            self.markers_enabled = settings.get('markers_enabled', False)
+            
         except Exception as e:
             print(f"Ошибка загрузки настроек: {e}")
     
     def quit_app(self):
         """Выход из приложения"""
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.calibration_pool:
+            self.calibration_pool.terminate()
         self.save_settings()
         self.root.quit()
         self.root.destroy()
@@ -810,19 +2487,503 @@ class DistanceOverlay:
         except KeyboardInterrupt:
             self.quit_app()
 
+class MarkerGrid:
+    """Пространственный индекс маркеров: равномерная сетка по экрану
+    
+    Маркер лежит в ячейке своей экранной позиции, поиск проверяет только
+    ячейки вокруг точки щелчка, перемещение маркера меняет одну запись.
+    """
+    
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}  # (столбец, строка) -> множество id маркеров
+        self.positions = {}  # id маркера -> (x, y)
+    
+    def cell_of(self, x, y):
+        """Ячейка, в которую попадает точка"""
+        return (int(x // self.cell_size), int(y // self.cell_size))
+    
+    def insert(self, marker_id, x, y):
+        """Добавить маркер или перенести уже добавленный"""
+        self.remove(marker_id)
+        self.positions[marker_id] = (x, y)
+        self.cells.setdefault(self.cell_of(x, y), set()).add(marker_id)
+    
+    def remove(self, marker_id):
+        """Убрать маркер из индекса (если он там есть)"""
+        position = self.positions.pop(marker_id, None)
+        if position is None:
+            return
+        cell = self.cell_of(*position)
+        self.cells[cell].discard(marker_id)
+        if not self.cells[cell]:
+            del self.cells[cell]
+    
+    def nearest(self, x, y, radius):
+        """Ближайший к точке маркер не дальше radius пикселей или None"""
+        best, best_distance = None, radius
+        first_col, first_row = self.cell_of(x - radius, y - radius)
+        last_col, last_row = self.cell_of(x + radius, y + radius)
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                for marker_id in self.cells.get((col, row), ()):
+                    marker_x, marker_y = self.positions[marker_id]
+                    distance = math.hypot(marker_x - x, marker_y - y)
+                    if distance <= best_distance:
+                        best, best_distance = marker_id, distance
+        return best
+
+class EventLoopWatchdog:
+    """Сторож цикла событий Tk в отдельном потоке
+    
+    Mainloop каждые WATCHDOG_HEARTBEAT_MS отправляет пульс через after() и
+    записывает, насколько пульс опоздал, в гистограмму. Поток сторожа следит
+    за временем с последнего пульса: сообщает о подвисаниях и, если цикл не
+    отвечает дольше timeout секунд, завершает приложение через quit_app.
+    """
+    
+    def __init__(self, app, timeout):
+        self.app = app
+        self.timeout = timeout  # Секунды без пульса до выхода (0 = только журнал)
+        self.histogram = [0] * (len(WATCHDOG_BUCKETS_MS) + 1)
+        self.worst_lag_ms = 0.0  # Худшая задержка за текущий период журнала
+        self.last_heartbeat = time.monotonic()
+        self.expected_heartbeat = self.last_heartbeat
+        self.tripped = False
+        self.stopped = threading.Event()
+        self.thread = Thread(target=self.watch, name='event-loop-watchdog', daemon=True)
+    
+    def start(self):
+        """Запустить пульс и поток сторожа (вызывается из главного потока)"""
+        # Процесс, запущенный в фоне (&) из скрипта, наследует SIGINT = SIG_IGN,
+        # и прерывание от сторожа молча терялось бы
+        if self.timeout:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+        
+        self.last_heartbeat = time.monotonic()
+        self.schedule_heartbeat()
+        self.thread.start()
+    
+    def stop(self):
+        """Остановить сторожа (вызывается из quit_app)"""
+        self.stopped.set()
+    
+    def schedule_heartbeat(self):
+        """Запланировать следующий пульс в mainloop"""
+        self.expected_heartbeat = time.monotonic() + WATCHDOG_HEARTBEAT_MS / 1000
+        self.app.root.after(WATCHDOG_HEARTBEAT_MS, self.heartbeat)
+    
+    def heartbeat(self):
+        """Пульс из mainloop: учесть опоздание и запланировать следующий"""
+        now = time.monotonic()
+        lag_ms = max(0.0, (now - self.expected_heartbeat) * 1000)
+        self.histogram[bisect_left(WATCHDOG_BUCKETS_MS, lag_ms)] += 1
+        self.worst_lag_ms = max(self.worst_lag_ms, lag_ms)
+        self.last_heartbeat = now
+        
+        if self.tripped:
+            # Цикл ожил после прерывания от сторожа - выходим штатно
+            self.app.quit_app()
+            return
+        
+        if not self.stopped.is_set():
+            self.schedule_heartbeat()
+    
+    def watch(self):
+        """Поток сторожа: проверка пульса, журнал подвисаний и гистограмм"""
+        last_poll = time.monotonic()
+        next_log = last_poll + WATCHDOG_LOG_INTERVAL
+        stall_reported = False
+        timeout_polls = 0  # Проверок подряд, на которых пульса нет дольше timeout
+        
+        while not self.stopped.wait(WATCHDOG_POLL_INTERVAL):
+            now = time.monotonic()
+            gap = now - last_poll
+            last_poll = now
+            
+            if gap > WATCHDOG_SUSPEND_GAP:
+                # Не проснулся и сам сторож - процесс стоял целиком (сон системы:
+                # на Windows monotonic() идет и во сне). Пульс не виноват, ждем заново
+                print(f"Сторож: процесс был приостановлен на {gap:.1f} с")
+                self.expected_heartbeat = now + WATCHDOG_HEARTBEAT_MS / 1000
+                timeout_polls = 0
+                continue
+            
+            silence = now - self.expected_heartbeat  # Насколько пульс уже опаздывает
+            
+            if silence * 1000 > WATCHDOG_STALL_MS:
+                if not stall_reported:
+                    print(f"Сторож: цикл событий не отвечает {silence * 1000:.0f} мс")
+                    stall_reported = True
+                if self.timeout and silence > self.timeout:
+                    timeout_polls += 1
+                    if timeout_polls >= WATCHDOG_TRIP_POLLS:
+                        self.trip(silence)
+                        return
+                else:
+                    timeout_polls = 0
+            elif stall_reported:
+                print("Сторож: цикл событий снова отвечает")
+                stall_reported = False
+                timeout_polls = 0
+            
+            if now >= next_log:
+                self.log_histogram()
+                next_log = now + WATCHDOG_LOG_INTERVAL
+    
+    def log_histogram(self):
+        """Вывести гистограмму задержек пульса"""
+        labels = [f"≤{bound}" for bound in WATCHDOG_BUCKETS_MS] + [f">{WATCHDOG_BUCKETS_MS[-1]}"]
+        buckets = ", ".join(f"{label}: {count}" for label, count in zip(labels, self.histogram) if count)
+        print(f"Сторож: задержка цикла событий (мс) {buckets}; макс за период {self.worst_lag_ms:.1f}")
+        self.worst_lag_ms = 0.0
+    
+    def trip(self, silence):
+        """Завершить зависшее приложение
+        
+        Tk нельзя трогать из другого потока, поэтому главный поток прерывается
+        KeyboardInterrupt: run() или следующий пульс вызовут quit_app. Если цикл
+        так и не ожил, настройки сохраняются и процесс завершается принудительно.
+        """
+        print(f"Сторож: цикл событий не отвечает {silence:.1f} с, завершаем приложение")
+        self.log_histogram()
+        self.tripped = True
+        if hasattr(signal, 'pthread_kill'):
+            # Настоящий сигнал прерывает и блокирующие системные вызовы
+            signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+        else:
+            _thread.interrupt_main()
+        
+        if self.stopped.wait(WATCHDOG_EXIT_GRACE):
+            return  # quit_app отработал
+        
+        print("Сторож: quit_app не выполнился, аварийный выход")
+        self.app.save_settings()
+        if self.app.recorder:
+            self.app.recorder.save()
+        os._exit(1)
+
+class EventRecorder:
+    """Запись пользовательских событий с таймингом для воспроизведения
+    
+    Обработчики DistanceOverlay подменяются на экземпляре обертками, поэтому
+    клавиши, колесико, Scale и выбор монитора пишутся независимо от того,
+    откуда вызван обработчик. Вместе с вызовом сохраняются значения виджетов,
+    которые обработчик читает, и ответы диалогов.
+    """
+    
+    # Обработчик -> виджеты, состояние которых он читает
+    RECORDED_HANDLERS = {
+        'start_calibration': (),
+        'finish_calibration': (),
+        'cancel_calibration': (),
+        'on_mouse_wheel': (),
+        'on_calibration_click': (),
+        'clear_calibration_samples': (),
+        'toggle_overlay': (),
+        'set_distance': (),
+        'add_distance': (),
+        'add_distance_range': (),
+        'remove_distance': (),
+        'toggle_perspective': ('perspective_var',),
+        'update_perspective': ('horizon_scale', 'ratio_scale'),
+        'update_foot_position': ('foot_scale',),
+        'toggle_camera_model': ('camera_model_var',),
+        'update_camera_model': ('fov_scale', 'camera_height_scale', 'pitch_scale'),
+        'toggle_range_finder': ('range_finder_var',),
+        'switch_zoom_layer': (),
+        'toggle_markers': ('markers_var',),
+        'clear_markers': (),
+        'on_marker_press': (),
+        'on_marker_drag': (),
+        'on_marker_release': (),
+        'on_marker_delete': (),
+        'add_marker': (),
+        'add_zoom_layer': (),
+        'remove_zoom_layer': (),
+        'on_pointer_motion': (),
+        'change_monitor': (),
+    }
+    
+    # Поля tk.Event, которые нужны обработчикам
+    EVENT_FIELDS = ('x', 'y', 'delta', 'num', 'keysym')
+    
+    def __init__(self, trace_file):
+        self.trace_file = trace_file
+        self.app = None
+        self.events = []
+        self.settings = None
+        self.screen = None
+        self.start_time = None
+        self.current_event = None  # Событие, внутри обработчика которого мы находимся
+        self.original_askstring = None
+    
+    def install(self, app):
+        """Подменить обработчики приложения записывающими обертками"""
+        self.app = app
+        # get_settings возвращает копию, поэтому дальнейшие правки не попадут
+        # в исходное состояние трассы
+        self.settings = app.get_settings()
+        self.start_time = time.perf_counter()
+        
+        for name in self.RECORDED_HANDLERS:
+            setattr(app, name, self.wrap_handler(name, getattr(app, name)))
+        
+        # Ответы диалогов нужны, чтобы повторить калибровку без пользователя
+        self.original_askstring = simpledialog.askstring
+        simpledialog.askstring = self.record_askstring
+    
+    def wrap_handler(self, name, handler):
+        """Обертка, записывающая вызов обработчика"""
+        def recorded(*args):
+            if self.current_event is not None:
+                # Вложенный вызов - уже покрыт внешним событием
+                return handler(*args)
+            
+            self.current_event = {
+                't': time.perf_counter() - self.start_time,
+                'handler': name,
+                'args': [self.serialize_arg(arg) for arg in args],
+                'widgets': self.read_widgets(name),
+                'dialogs': []
+            }
+            try:
+                return handler(*args)
+            finally:
+                self.events.append(self.current_event)
+                self.current_event = None
+        return recorded
+    
+    def record_askstring(self, *args, **kwargs):
+        """simpledialog.askstring с сохранением ответа в текущее событие"""
+        answer = self.original_askstring(*args, **kwargs)
+        if self.current_event is not None:
+            self.current_event['dialogs'].append(answer)
+        return answer
+    
+    def read_widgets(self, name):
+        """Значения виджетов, которые читает обработчик"""
+        widgets = {}
+        for attr in self.RECORDED_HANDLERS[name]:
+            widget = getattr(self.app, attr, None)
+            if widget is None:
+                continue
+            widgets[attr] = widget.get()
+        return widgets
+    
+    def serialize_arg(self, arg):
+        """Аргумент обработчика в JSON-совместимом виде"""
+        if isinstance(arg, tk.Event):
+            return {'event': {field: getattr(arg, field, None) for field in self.EVENT_FIELDS}}
+        return arg
+    
+    def save(self):
+        """Сохранить трассу в файл"""
+        if self.original_askstring is not None:
+            simpledialog.askstring = self.original_askstring
+        
+        # Событие, внутри которого приложение зависло (аварийный выход по
+        # сторожу), тоже сохраняем - ради него трассу и записывали
+        events = self.events
+        if self.current_event is not None:
+            events = events + [self.current_event]
+        
+        trace = {
+            'version': 1,
+            'settings': self.settings,
+            'screen': self.screen,
+            'events': events
+        }
+        try:
+            with open(self.trace_file, 'w', encoding='utf-8') as f:
+                json.dump(trace, f, indent=1, ensure_ascii=False)
+            print(f"Записано событий: {len(self.events)} -> {self.trace_file}")
+        except Exception as e:
+            print(f"Ошибка сохранения трассы: {e}")
+
+class EventReplayer:
+    """Воспроизведение записанной трассы без участия пользователя
+    
+    Приложение создается с настройками из трассы во временном файле, окна
+    скрываются, диалоги отвечают записанными ответами. Для каждого события
+    измеряется время обработчика вместе с отложенными (idle) перерисовками.
+    Tk требует X-сервер, на машине без монитора запускайте под Xvfb.
+    """
+    
+    def __init__(self, trace_file, max_speed=False):
+        with open(trace_file, 'r', encoding='utf-8') as f:
+            self.trace = json.load(f)
+        self.max_speed = max_speed
+        self.results = []
+        self.dialog_answers = []
+    
+    def run(self):
+        """Воспроизвести трассу и вернуть задержки по событиям"""
+        settings_fd, settings_path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(settings_fd, 'w', encoding='utf-8') as f:
+            json.dump(self.trace['settings'], f)
+        
+        original_askstring = simpledialog.askstring
+        original_showinfo = messagebox.showinfo
+        original_showerror = messagebox.showerror
+        simpledialog.askstring = lambda *args, **kwargs: self.dialog_answers.pop(0) if self.dialog_answers else None
+        messagebox.showinfo = lambda *args, **kwargs: 'ok'
+        messagebox.showerror = lambda *args, **kwargs: 'ok'
+        
+        app = None
+        try:
+            # Окна остаются на экране: задержка события включает перерисовку
+            # canvas, из-за которой и заметны подтормаживания ползунков
+            app = DistanceOverlay(settings_file=settings_path)
+            
+            # Приложение ведут только записанные события: живой указатель
+            # (опрос на Windows или события мыши на оверлее) отключаем
+            if app.pointer_poll_job is not None:
+                app.root.after_cancel(app.pointer_poll_job)
+                app.pointer_poll_job = None
+            for sequence in ('<Motion>', '<Leave>', '<Button-1>', '<B1-Motion>',
+                             '<ButtonRelease-1>', '<Button-3>'):
+                app.canvas.unbind(sequence)
+            
+            screen = [app.screen_width, app.screen_height]
+            if self.trace.get('screen') and self.trace['screen'] != screen:
+                print(f"Внимание: трасса записана на экране {self.trace['screen']}, "
+                      f"воспроизведение на {screen}")
+            
+            # Scale сами вызывают команду при set() - здесь команды вызывает трасса
+            for attr in ('horizon_scale', 'ratio_scale', 'foot_scale',
+                         'fov_scale', 'camera_height_scale', 'pitch_scale'):
+                getattr(app, attr).configure(command='')
+            app.root.update()
+            
+            start = time.perf_counter()
+            for event in self.trace['events']:
+                if not self.max_speed:
+                    # Ждем исходного момента, обрабатывая события Tk
+                    while time.perf_counter() - start < event['t']:
+                        app.root.update()
+                        time.sleep(0.001)
+                
+                self.restore_widgets(app, event['widgets'])
+                self.dialog_answers = list(event['dialogs'])
+                handler = getattr(app, event['handler'])
+                args = [self.deserialize_arg(arg) for arg in event['args']]
+                
+                begin = time.perf_counter()
+                handler(*args)
+                app.root.update_idletasks()
+                latency = time.perf_counter() - begin
+                
+                self.results.append((event['t'], event['handler'], latency))
+            
+            app.root.destroy()
+        finally:
+            # quit_app здесь не вызывается (он перезаписал бы настройки) - пул
+            # подгонки калибровки закрываем сами
+            if app is not None and app.calibration_pool:
+                app.calibration_pool.terminate()
+            simpledialog.askstring = original_askstring
+            messagebox.showinfo = original_showinfo
+            messagebox.showerror = original_showerror
+            os.remove(settings_path)
+        
+        return self.results
+    
+    def restore_widgets(self, app, widgets):
+        """Выставить виджетам значения, которые были в момент записи"""
+        for attr, value in widgets.items():
+            widget = getattr(app, attr, None)
+            if widget is None:
+                continue
+            widget.set(value)
+    
+    def deserialize_arg(self, arg):
+        """Восстановить аргумент обработчика (tk.Event из словаря)"""
+        if isinstance(arg, dict) and 'event' in arg:
+            event = tk.Event()
+            for field, value in arg['event'].items():
+                setattr(event, field, value)
+            return event
+        return arg
+    
+    def print_report(self):
+        """Сводка задержек по обработчикам"""
+        print(f"Воспроизведено событий: {len(self.results)} "
+              f"({'максимальная скорость' if self.max_speed else 'исходный тайминг'}); "
+              f"задержка включает перерисовку окон")
+        print(f"{'Обработчик':<24}{'N':>6}{'сред, мс':>10}{'p50, мс':>10}{'p95, мс':>10}{'макс, мс':>10}")
+        
+        by_handler = {}
+        for _, handler, latency in self.results:
+            by_handler.setdefault(handler, []).append(latency * 1000)
+        
+        for handler, latencies in sorted(by_handler.items()):
+            latencies.sort()
+            count = len(latencies)
+            print(f"{handler:<24}{count:>6}"
+                  f"{sum(latencies) / count:>10.2f}"
+                  f"{latencies[count // 2]:>10.2f}"
+                  f"{latencies[min(count - 1, int(count * 0.95))]:>10.2f}"
+                  f"{latencies[-1]:>10.2f}")
+    
+    def save_report(self, report_file):
+        """Сохранить задержки по каждому событию в JSON"""
+        report = [
+            {'t': t, 'handler': handler, 'latency_ms': latency * 1000}
+            for t, handler, latency in self.results
+        ]
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+
 def main():
     """Главная функция"""
+    multiprocessing.freeze_support()
+    
+    parser = argparse.ArgumentParser(description="Distance Attack - оверлей дистанций")
+    parser.add_argument('--record', metavar='TRACE', help="записать события сессии в файл")
+    parser.add_argument('--replay', metavar='TRACE', help="воспроизвести записанную трассу и вывести задержки")
+    parser.add_argument('--max-speed', action='store_true', help="воспроизводить без пауз между событиями")
+    parser.add_argument('--report', metavar='FILE', help="сохранить задержки по событиям в JSON")
+    parser.add_argument('--ipc-port', metavar='PORT', type=int, default=0,
+                        help="принимать команды смены зума по UDP на 127.0.0.1:PORT (например, 'zoom next')")
+    parser.add_argument('--watchdog-timeout', metavar='SEC', type=float, default=30,
+                        help="закрыть приложение, если цикл событий не отвечает дольше SEC секунд (0 = не закрывать)")
+    args = parser.parse_args()
+    
+    if args.replay:
+        replayer = EventReplayer(args.replay, max_speed=args.max_speed)
+        replayer.run()
+        replayer.print_report()
+        if args.report:
+            replayer.save_report(args.report)
+        return
+    
     print("Distance Attack - Оверлей для показа расстояний в шутерах")
     print("Автор: DeadLarsen")
     print()
     print("Горячие клавиши:")
     print("F1 - Калибровка")
     print("F2 - Включить/Выключить оверлей")
+    print("F3 - Дальномер под курсором")
+    print("F4 - Следующий уровень зума")
+    print("F5 - Редактирование маркеров")
     print("ESC - Выход")
     print()
     
-    app = DistanceOverlay()
+    recorder = EventRecorder(args.record) if args.record else None
+    app = DistanceOverlay(recorder=recorder)
+    if recorder:
+        recorder.screen = [app.screen_width, app.screen_height]
+    
+    if args.ipc_port:
+        app.start_ipc_listener(args.ipc_port)
+    
+    app.watchdog = EventLoopWatchdog(app, args.watchdog_timeout)
+    app.watchdog.start()
     app.run()
+    
+    if recorder:
+        recorder.save()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
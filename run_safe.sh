@@ -15,6 +15,7 @@ if [[ "$OSTYPE" == "linux-gnu"* ]]; then
     echo "   - Оставлены элементы управления окном"
     echo "   - Добавлена красная кнопка выхода"
     echo "   - Доступны дополнительные горячие клавиши"
+    echo "   - Программа сама закроется, если зависнет дольше 30 секунд"
     echo
     echo "🔑 Способы выхода из программы:"
     echo "   - ESC"
@@ -50,11 +51,11 @@ echo "🚀 Запуск Distance Attack в безопасном режиме..."
 echo
 
 # Запуск программы
-timeout 300 python3 main.py &  # Автовыключение через 5 минут
+python3 main.py --watchdog-timeout 30 &  # Выход при зависании интерфейса дольше 30 секунд
 PID=$!
 
 echo "📋 Программа запущена (PID: $PID)"
-echo "⏰ Автовыключение через 5 минут"
+echo "⏰ Автовыключение при зависании интерфейса дольше 30 секунд"
 echo "🛑 Для принудительной остановки: kill $PID"
 echo
 